@@ -3,50 +3,1826 @@
 Excelファイルのパスとタブ名（シート名）を指定してVLOOKUPを実行するツール
 """
 
-import pandas as pd
+import hashlib
+import io
+import json
 import os
+import pickle
+import sys
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, redirect_stdout
 from datetime import datetime
+from itertools import chain
+
+# pandas / numpy / openpyxl は読み込みに時間がかかるため、使用する関数内でインポートする
+# （メニュー表示・設定テンプレート作成・--help などデータ処理を伴わない起動を高速化）
+
+# ストリーミング読み込み時の既定チャンク行数
+DEFAULT_CHUNK_SIZE = 50000
+
+# VLOOKUPの結合エンジン
+# merge: DataFrame.merge（既定）
+# index: マスタ検索キーのpd.Indexを再利用し、行位置で取得列を取り出す
+LOOKUP_ENGINES = ("merge", "index")
+
+# 照合方法
+# exact: 完全一致（VLOOKUPのFALSE）
+# approximate: 検索キー以下で最大のマスタキーに一致（VLOOKUPのTRUE、料金表・税率表など）
+# date_range: 同じキーのマスタ行のうち、Excel1の日付列(date_col)を
+#             [開始日(start_col), 終了日(end_col)]の期間に含む行に一致（適用期間付きマスタ）
+MATCH_MODES = ("exact", "approximate", "date_range")
+
+# 検索キーの正規化（照合時のみ適用し、出力するキーの値は変更しない）
+# nfkc: 全角英数字・記号を半角に変換（Unicode NFKC正規化）
+# strip: 前後の空白を除去
+# casefold: 大文字・小文字を区別しない
+# remove_hyphen: ハイフン類（- ‐ − – — －）を除去
+# zfill:N: 数字のみのキーをN桁にゼロ埋め（例: "zfill:6"）
+# 指定順に関係なく上記の順で適用する。key_normalize=True の場合は DEFAULT_KEY_NORMALIZE
+KEY_NORMALIZE_STEPS = ("nfkc", "strip", "casefold", "remove_hyphen", "zfill")
+DEFAULT_KEY_NORMALIZE = ("nfkc", "strip", "casefold")
+HYPHEN_PATTERN = "[-‐‑−–—－]"
+
+# マスタの重複キーの扱い（duplicate_policy）
+# first: 先頭行を使用（既定）, last: 最終行を使用, error: 重複があればエラー
+# aggregate:方法: 重複行の取得列を集約（sum: 数値列の合計, max: 数値・日付列の最大値,
+#                 concat: 値を連結。sum/maxの対象外の列はconcat。方法の省略時はconcat）
+DUPLICATE_POLICIES = ("first", "last", "error", "aggregate")
+DUPLICATE_AGGREGATES = ("sum", "max", "concat")
+DUPLICATE_CONCAT_SEPARATOR = " / "
+
+# マスタキャッシュの既定保存ディレクトリ名（ユーザーごとのキャッシュディレクトリ内に作成）
+MASTER_CACHE_DIRNAME = "vlookup"
+
+# Excel1シートあたりの最大行数（ヘッダー行を含む）
+EXCEL_MAX_ROWS = 1048576
+
+# 大規模サンプル作成時の検索キーの型
+# str: "K000000001"形式の文字列, int: 整数
+# mixed: マスタは整数、Excel1は数字の文字列（キーの型変換を伴う照合）
+SYNTHETIC_KEY_DTYPES = ("str", "int", "mixed")
+
+# コンソール表示レベル
+# quiet: エラー・警告のみ
+# normal: 処理状況と件数
+# detail: データプレビュー・列名・マッチしなかったキーも表示（既定）
+VERBOSITY_QUIET = 0
+VERBOSITY_NORMAL = 1
+VERBOSITY_DETAIL = 2
+VERBOSITY_LEVELS = {
+    "quiet": VERBOSITY_QUIET,
+    "normal": VERBOSITY_NORMAL,
+    "detail": VERBOSITY_DETAIL,
+}
+
+
+class PreparedMaster:
+    """
+    VLOOKUP用に整形済みのマスタデータ
+
+    検索キー列+取得列のみを持ち、キーの重複を解消済みの状態（キーの型は元のまま）。
+    一度作成すれば複数のExcel1ファイルに対してそのまま再利用できる
+    lookup_colに列名のリストを指定すると複合キーとして照合する
+    range_cols: 期間照合（date_range）用の(開始日列, 終了日列)。指定時は同じキーの行を
+                期間ごとに保持する
+    duplicates: 作成時に検出した重複キーのレポート（重複がなければNone）
+    duplicate_policy: 重複キーの解消方法（parse_duplicate_policyの戻り値）
+    """
+
+    def __init__(
+        self,
+        data,
+        lookup_col,
+        return_cols,
+        source_path=None,
+        sheet_name=None,
+        range_cols=None,
+        duplicates=None,
+        duplicate_policy="first",
+    ):
+        self.data = data
+        self.lookup_col = lookup_col
+        self.return_cols = list(return_cols)
+        self.source_path = source_path
+        self.sheet_name = sheet_name
+        self.range_cols = tuple(range_cols) if range_cols else None
+        self.duplicates = duplicates
+        self.duplicate_policy = duplicate_policy
+        self._key_kind = None
+        self._key_strings = None
+        self._normalized_keys = {}
+        self._indexes = {}
+        self._column_keys = {}
+        self._composite_indexes = {}
+        self._key_groups = {}
+        self._ranges = {}
+        self._sorted_keys = None
+
+    @property
+    def lookup_cols(self):
+        """検索キー列名のリスト（単一キーの場合は1列）"""
+        return key_columns(self.lookup_col)
+
+    @property
+    def is_composite(self):
+        return len(self.lookup_cols) > 1
+
+    @property
+    def key_kind(self):
+        """検索キー列の種類（初回アクセス時に判定）"""
+        if self._key_kind is None:
+            self._key_kind = key_kind(self.data[self.lookup_col])
+        return self._key_kind
+
+    @property
+    def key_strings(self):
+        """文字列化した検索キー（Excel1側とキーの型が異なる場合のみ作成）"""
+        import numpy as np
+
+        if self._key_strings is None:
+            self._key_strings = np.asarray(
+                key_strings(self.data[self.lookup_col]), dtype=object
+            )
+        return self._key_strings
+
+    def normalized_keys(self, steps):
+        """正規化した検索キー（正規化手順ごとに初回のみ計算して再利用）"""
+        import numpy as np
+
+        if steps not in self._normalized_keys:
+            self._normalized_keys[steps] = np.asarray(
+                normalize_keys(self.data[self.lookup_col], steps), dtype=object
+            )
+        return self._normalized_keys[steps]
+
+    def needs_string_keys(self, keys):
+        """Excel1側の検索キーと型が異なり、文字列での照合が必要か"""
+        kind = key_kind(keys)
+        return kind != self.key_kind or kind == "mixed"
+
+    def _key_index(self, variant):
+        """
+        検索用のpd.Indexと元の行位置（初回作成後は再利用）
+
+        variant: False（元のキー）, True（文字列化したキー）, 正規化手順のタプル
+        文字列化・正規化で同じキーになった行は先頭行のみを対象にする
+        """
+        import numpy as np
+        import pandas as pd
+
+        if variant not in self._indexes:
+            if isinstance(variant, tuple):
+                keys = self.normalized_keys(variant)
+            elif variant:
+                keys = self.key_strings
+            else:
+                keys = self.data[self.lookup_col]
+            index = pd.Index(keys)
+            row_positions = None
+            if not index.is_unique:
+                first = ~index.duplicated()
+                index = index[first]
+                row_positions = np.flatnonzero(first)
+            self._indexes[variant] = (index, row_positions)
+        return self._indexes[variant]
+
+    def lookup_positions(self, keys, key_normalize=()):
+        """
+        検索キーに対応するマスタの行位置を返す（見つからないキー・空欄は-1）
+
+        key_normalize: 正規化手順のタプル（parse_key_normalizeの戻り値）
+        """
+        import numpy as np
+        import pandas as pd
+
+        if isinstance(keys, pd.DataFrame):
+            return self.composite_positions(keys, key_normalize)
+
+        if key_normalize:
+            index, row_positions = self._key_index(key_normalize)
+            search_keys = normalize_keys(keys, key_normalize)
+        elif self.needs_string_keys(keys):
+            index, row_positions = self._key_index(True)
+            search_keys = key_strings(keys)
+        else:
+            index, row_positions = self._key_index(False)
+            search_keys = keys
+
+        positions = index.get_indexer(search_keys)
+        if row_positions is not None:
+            positions = np.where(positions >= 0, row_positions[positions], -1)
+        positions[np.asarray(pd.isna(search_keys))] = -1
+        return positions
+
+    def _column_key_index(self, i, variant):
+        """
+        複合キーのi列目: マスタ各行のキー番号と、番号に対応するキーのpd.Index
+
+        variant: False（元のキー）, True（文字列化したキー）, 正規化手順のタプル
+        """
+        import numpy as np
+        import pandas as pd
+
+        if (i, variant) not in self._column_keys:
+            values = self.data[self.lookup_cols[i]]
+            if isinstance(variant, tuple):
+                keys = normalize_keys(values, variant)
+            elif variant:
+                keys = key_strings(values)
+            else:
+                keys = pd.Categorical(values)
+            codes = np.asarray(keys.codes, dtype=np.int64)
+            self._column_keys[(i, variant)] = (codes, pd.Index(keys.categories))
+        return self._column_keys[(i, variant)]
+
+    def _composite_index(self, variants):
+        """
+        複合キーの照合用インデックス（列の組み合わせごとに初回のみ作成）
+
+        列ごとのキー番号を1列ずつ組み合わせて連番に振り直し、各段階の対応表と
+        組み合わせ番号ごとのマスタ先頭行を返す（キーを連結した文字列は作成しない）
+        """
+        import numpy as np
+        import pandas as pd
+
+        if variants not in self._composite_indexes:
+            combined = np.zeros(len(self.data), dtype=np.int64)
+            steps = []
+            for i, variant in enumerate(variants):
+                codes, categories = self._column_key_index(i, variant)
+                valid = (combined >= 0) & (codes >= 0)
+                pairs = combined[valid] * len(categories) + codes[valid]
+                combined = np.full(len(self.data), -1, dtype=np.int64)
+                combined[valid], uniques = pd.factorize(pairs)
+                steps.append(pd.Index(uniques))
+
+            # 同じ組み合わせになった行は先頭行を使用
+            first_rows = np.full(len(steps[-1]) if steps else 0, -1, dtype=np.intp)
+            valid_rows = np.flatnonzero(combined >= 0)[::-1]
+            first_rows[combined[valid_rows]] = valid_rows
+            self._composite_indexes[variants] = (steps, first_rows, combined)
+        return self._composite_indexes[variants]
+
+    def composite_positions(self, keys, key_normalize=()):
+        """
+        複合キー（Excel1側はキー列のDataFrame）に対応するマスタの行位置を返す
+        いずれかのキーが空欄・見つからない行は-1
+        """
+        import numpy as np
+
+        groups, first_rows, _ = self._composite_groups(keys, key_normalize)
+        return np.where(groups >= 0, first_rows[np.maximum(groups, 0)], -1)
+
+    def _composite_groups(self, keys, key_normalize=()):
+        """複合キーの組み合わせ番号（見つからない行は-1）と番号ごとのマスタ先頭行"""
+        import numpy as np
+
+        if keys.shape[1] != len(self.lookup_cols):
+            raise ValueError(
+                f"検索キーの列数がマスタと一致しません"
+                f"（Excel1: {list(keys.columns)}, マスタ: {self.lookup_cols}）"
+            )
+
+        variants = []
+        search_keys = []
+        for i, col in enumerate(self.lookup_cols):
+            values = keys.iloc[:, i]
+            if key_normalize:
+                variants.append(key_normalize)
+                search_keys.append(normalize_keys(values, key_normalize))
+            elif key_kind(values) != key_kind(self.data[col]) or key_kind(values) == "mixed":
+                variants.append(True)
+                search_keys.append(key_strings(values))
+            else:
+                variants.append(False)
+                search_keys.append(values)
+        steps, first_rows, _ = self._composite_index(tuple(variants))
+
+        combined = np.zeros(len(keys), dtype=np.int64)
+        for i, (variant, step) in enumerate(zip(variants, steps)):
+            categories = self._column_key_index(i, variant)[1]
+            codes = categories.get_indexer(search_keys[i])
+            valid = (combined >= 0) & (codes >= 0)
+            pairs = combined[valid] * len(categories) + codes[valid]
+            combined = np.full(len(keys), -1, dtype=np.int64)
+            combined[valid] = step.get_indexer(pairs)
+
+        return combined, first_rows, tuple(variants)
+
+    def key_groups(self, keys, key_normalize=()):
+        """
+        マスタ各行とExcel1各行のキー番号（同じキーは同じ番号、見つからない・空欄は-1）
+
+        期間照合でキーごとに行をまとめるために使用（マスタ側は初回のみ計算）。
+        (マスタ側の番号, Excel1側の番号, キーの照合方法)を返す
+        """
+        import numpy as np
+        import pandas as pd
+
+        if isinstance(keys, pd.DataFrame):
+            search_groups, _, variants = self._composite_groups(keys, key_normalize)
+            return self._composite_index(variants)[2], search_groups, variants
+
+        if key_normalize:
+            variant = key_normalize
+            search_keys = normalize_keys(keys, key_normalize)
+        elif self.needs_string_keys(keys):
+            variant = True
+            search_keys = key_strings(keys)
+        else:
+            variant = False
+            search_keys = keys
+        index, _ = self._key_index(variant)
+
+        if variant not in self._key_groups:
+            if isinstance(variant, tuple):
+                master_keys = self.normalized_keys(variant)
+            elif variant:
+                master_keys = self.key_strings
+            else:
+                master_keys = self.data[self.lookup_col]
+            master_groups = index.get_indexer(master_keys)
+            master_groups[np.asarray(pd.isna(master_keys))] = -1
+            self._key_groups[variant] = master_groups
+
+        search_groups = index.get_indexer(search_keys)
+        search_groups[np.asarray(pd.isna(search_keys))] = -1
+        return self._key_groups[variant], search_groups, variant
+
+    def _range_table(self, variant, master_groups):
+        """
+        期間照合用に開始日でソートしたマスタ（キー番号・開始日・終了日・行位置）
+        キーの照合方法ごとに初回のみ作成
+        期間が重なる場合は重ならない区間に分割し、各区間には開始日が最も遅い期間の行を
+        割り当てる（例: 通年の期間の中に短い期間があれば、短い期間外は通年の行）
+        """
+        import numpy as np
+        import pandas as pd
+
+        if variant not in self._ranges:
+            start_col, end_col = self.range_cols
+            table = pd.DataFrame(
+                {
+                    "group": master_groups,
+                    "start": pd.to_datetime(self.data[start_col], errors="coerce").array,
+                    "end": pd.to_datetime(self.data[end_col], errors="coerce").array,
+                    "position": np.arange(len(self.data)),
+                }
+            )
+            table = table[(table["group"] >= 0) & table["start"].notna()]
+            self._ranges[variant] = split_periods(table).sort_values("start")
+        return self._ranges[variant]
+
+    def date_range_positions(self, keys, dates, key_normalize=()):
+        """
+        期間照合: 同じキーのマスタ行のうち、開始日 <= 日付 <= 終了日 の行位置を返す
+
+        キーごとに重ならない区間に分割したマスタ（split_periods）をmerge_asofで検索し、
+        日付以前で開始日が直近の区間を求めてから終了日を確認する（終了日が空欄の行は
+        終了日なし）。期間が重なる場合は日付を含む期間のうち開始日が最も遅い行。
+        該当なし・キーや日付が空欄は-1
+        """
+        import numpy as np
+        import pandas as pd
+
+        if not self.range_cols:
+            raise ValueError("期間照合にはstart_col・end_colを指定したマスタが必要です")
+
+        master_groups, search_groups, variant = self.key_groups(keys, key_normalize)
+        table = self._range_table(variant, master_groups)
+
+        left = pd.DataFrame(
+            {
+                "group": search_groups,
+                # 区間表（split_periods）と同じナノ秒単位にそろえる
+                "date": pd.to_datetime(dates, errors="coerce").astype("datetime64[ns]").array,
+                "row": np.arange(len(search_groups)),
+            }
+        )
+        left = left[(left["group"] >= 0) & left["date"].notna()].sort_values("date")
+
+        merged = pd.merge_asof(
+            left,
+            table,
+            left_on="date",
+            right_on="start",
+            by="group",
+            direction="backward",
+        )
+        found = merged["position"].notna() & (
+            merged["end"].isna() | (merged["date"] <= merged["end"])
+        )
+
+        positions = np.full(len(search_groups), -1, dtype=np.intp)
+        positions[merged.loc[found, "row"].to_numpy()] = (
+            merged.loc[found, "position"].to_numpy().astype(np.intp)
+        )
+        return positions
+
+    def _sorted(self):
+        """近似一致用に検索キーを昇順ソートした配列と元の行位置（初回のみソート）"""
+        import numpy as np
+        import pandas as pd
+
+        if self._sorted_keys is None:
+            keys = self.data[self.lookup_col]
+            if self.key_kind == "number":
+                keys = pd.to_numeric(keys).to_numpy(dtype="float64")
+            else:
+                keys = keys.to_numpy()
+            order = np.argsort(keys, kind="stable")
+            self._sorted_keys = (keys[order], order)
+        return self._sorted_keys
+
+    def approximate_positions(self, keys):
+        """
+        近似一致（VLOOKUPのTRUE）で検索キーに対応するマスタの行位置を返す
+        検索キー以下で最大のマスタキーの行。該当なし・空欄は-1
+        """
+        import numpy as np
+        import pandas as pd
+
+        # 数値マスタの場合、数値に変換できない検索キーは該当なしとする
+        if self.key_kind == "number":
+            values = pd.to_numeric(keys, errors="coerce").to_numpy(dtype="float64")
+        elif key_kind(keys) == self.key_kind:
+            values = keys.to_numpy()
+        else:
+            raise ValueError(
+                f"近似一致では検索キーとマスタキーの型をそろえてください"
+                f"（Excel1: {key_kind(keys)}, マスタ: {self.key_kind}）"
+            )
+        missing = np.asarray(pd.isna(values))
+
+        sorted_keys, order = self._sorted()
+        if len(sorted_keys) == 0:
+            return np.full(len(values), -1, dtype=np.intp)
+        if missing.any():
+            values = np.where(missing, sorted_keys[0], values)
+
+        # ソート済みキーを二分探索（O(n log m)）
+        found = np.searchsorted(sorted_keys, values, side="right") - 1
+        positions = np.where(found >= 0, order[np.maximum(found, 0)], -1)
+        positions[missing] = -1
+        return positions
+
+    def find_positions(self, keys, match_mode="exact", key_normalize=(), dates=None):
+        """
+        照合方法に応じてマスタの行位置を返す（見つからないキーは-1）
+
+        dates: 期間照合（date_range）で使用するExcel1の日付列
+        """
+        if match_mode == "date_range":
+            if dates is None:
+                raise ValueError("期間照合（date_range）にはdate_colを指定してください")
+            return self.date_range_positions(keys, dates, key_normalize)
+        if match_mode == "approximate":
+            if self.is_composite:
+                raise ValueError("複合キーは完全一致（exact）でのみ使用できます")
+            if key_normalize:
+                raise ValueError("key_normalizeは完全一致（exact）でのみ使用できます")
+            return self.approximate_positions(keys)
+        if match_mode == "exact":
+            return self.lookup_positions(keys, key_normalize)
+        raise ValueError(
+            f"不明なmatch_modeです: {match_mode}（{', '.join(MATCH_MODES)}）"
+        )
+
+    def take(self, positions, columns=None):
+        """行位置から列の値を取り出す（-1の位置は欠損値）"""
+        import pandas as pd
+
+        if columns is None:
+            columns = self.return_cols
+        return {
+            col: pd.api.extensions.take(
+                self.data[col].array, positions, allow_fill=True
+            )
+            for col in columns
+        }
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return (
+            f"PreparedMaster({self.source_path!r}, sheet={self.sheet_name!r}, "
+            f"lookup_col={self.lookup_col!r}, rows={len(self.data)})"
+        )
+
+
+class StreamingExcelWriter:
+    """
+    openpyxlのwrite_onlyモードでDataFrameを追記していくExcelライター
+    書き込んだ行はメモリに保持しないため、チャンク単位の出力に使用する
+    """
+
+    def __init__(self, output_path, sheet_name="VLOOKUP結果"):
+        self.output_path = output_path
+        self.sheet_name = sheet_name
+        self.workbook = self._open_workbook()
+        self.worksheet = None
+        self.columns = None
+        self.sheet_count = 0
+        self.sheet_rows = 0
+        self.total_rows = 0
+
+    def _open_workbook(self):
+        from openpyxl import Workbook
+
+        return Workbook(write_only=True)
+
+    def _create_sheet(self, title):
+        return self.workbook.create_sheet(title)
+
+    def _append(self, worksheet, row_index, values, header=False):
+        """1行書き込み（ヘッダーは太字、pandas.to_excelと同じ見た目）"""
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+
+        if header:
+            cells = []
+            for value in values:
+                cell = WriteOnlyCell(worksheet, value=str(value))
+                cell.font = Font(bold=True)
+                cells.append(cell)
+            values = cells
+        worksheet.append(values)
+
+    def _save(self):
+        self.workbook.save(self.output_path)
+
+    def _next_sheet(self):
+        """結果シートを追加（行数上限を超えた場合は連番シートに続きを書く）"""
+        self.sheet_count += 1
+        title = self.sheet_name
+        if self.sheet_count > 1:
+            title = f"{self.sheet_name}_{self.sheet_count}"
+        self.worksheet = self._create_sheet(title)
+        self._append(self.worksheet, 0, self.columns, header=True)
+        self.sheet_rows = 1
+
+    def write_dataframe(self, df):
+        """結果シートにDataFrameの行を追記"""
+        if self.worksheet is None:
+            self.columns = list(df.columns)
+            self._next_sheet()
+
+        for row in dataframe_rows(df):
+            if self.sheet_rows >= EXCEL_MAX_ROWS:
+                self._next_sheet()
+            self._append(self.worksheet, self.sheet_rows, row)
+            self.sheet_rows += 1
+        self.total_rows += len(df)
+
+    def add_sheet(self, sheet_name, df):
+        """小さなDataFrame（サマリー等）を別シートとして追加"""
+        worksheet = self._create_sheet(sheet_name)
+        self._append(worksheet, 0, list(df.columns), header=True)
+        for row_index, row in enumerate(dataframe_rows(df), 1):
+            self._append(worksheet, row_index, row)
+
+    def close(self):
+        """ファイルに保存して閉じる"""
+        if self.worksheet is None:
+            self.columns = []
+            self._next_sheet()
+        self._save()
+
+    def abort(self):
+        """
+        書き込みを中止
+        write_onlyのブックは保存するまで結果ファイルを作成しないため、
+        書き込み中のシートの一時ファイルだけを閉じる
+        """
+        for worksheet in self.workbook.worksheets:
+            try:
+                if not worksheet.closed:
+                    worksheet.close()
+            except Exception:
+                pass
+        self.workbook = None
+
+
+class XlsxwriterStreamingWriter(StreamingExcelWriter):
+    """
+    xlsxwriterのconstant_memoryモードで書き込むライター
+    （xlsxwriterがインストールされている場合のみ使用可能）
+    """
+
+    def _open_workbook(self):
+        try:
+            import xlsxwriter
+        except ImportError:
+            raise ImportError(
+                "xlsxwriterがインストールされていません（pip install xlsxwriter）"
+            )
+
+        workbook = xlsxwriter.Workbook(self.output_path, {"constant_memory": True})
+        self.header_format = workbook.add_format({"bold": True})
+        self.date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+        return workbook
+
+    def _create_sheet(self, title):
+        return self.workbook.add_worksheet(title)
+
+    def _append(self, worksheet, row_index, values, header=False):
+        if header:
+            worksheet.write_row(row_index, 0, [str(v) for v in values], self.header_format)
+            return
+        for col_index, value in enumerate(values):
+            if value is None:
+                continue
+            if isinstance(value, datetime):
+                worksheet.write_datetime(row_index, col_index, value, self.date_format)
+            else:
+                worksheet.write(row_index, col_index, value)
+
+    def _save(self):
+        self.workbook.close()
+
+    def abort(self):
+        """書き込みを中止し、作成途中の結果ファイルを削除"""
+        # 一時ファイルを片付けるため閉じてから、作成された結果ファイルを削除
+        try:
+            self.workbook.close()
+        except Exception:
+            pass
+        remove_partial_file(self.output_path)
+
+
+# 結果ファイルの書き込み方式
+# openpyxl: pandas.ExcelWriter（既定、全セルをメモリに保持してから保存）
+# stream: openpyxlのwrite_onlyモードで逐次書き込み
+# xlsxwriter: xlsxwriterのconstant_memoryモードで逐次書き込み（要xlsxwriter）
+WRITER_ENGINES = ("openpyxl", "stream", "xlsxwriter")
+
+
+class ColumnarResultWriter(ABC):
+    """
+    Excel以外の形式（CSV / Parquet / Feather）で結果を逐次書き込むライター
+
+    サマリー等の追加シートはサイドカーJSON（<出力ファイル名>_summary.json）に保存
+    形式ごとのサブクラスで_write_chunk, _finish, _discardを実装する
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.summary_path = f"{os.path.splitext(output_path)[0]}_summary.json"
+        self.sheets = {}
+        self.total_rows = 0
+
+    def write_dataframe(self, df):
+        """結果ファイルにDataFrameの行を追記"""
+        self._write_chunk(df)
+        self.total_rows += len(df)
+
+    def add_sheet(self, sheet_name, df):
+        """追加シートの内容をサイドカーJSON用に保持"""
+        self.sheets[sheet_name] = df
+
+    def close(self):
+        """
+        結果ファイルを閉じ、サイドカーJSONを書き込み
+        戻り値はサイドカーJSONのパス（追加シートがなければNone）
+        """
+        self._finish()
+        if self.sheets:
+            summary = {
+                sheet_name: json.loads(df.to_json(orient="records", force_ascii=False))
+                for sheet_name, df in self.sheets.items()
+            }
+            with open(self.summary_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            return self.summary_path
+        return None
+
+    def abort(self):
+        """書き込みを中止し、作成途中の結果ファイルを削除"""
+        if self._discard():
+            remove_partial_file(self.output_path)
+
+    @abstractmethod
+    def _write_chunk(self, df):
+        """DataFrameの行を結果ファイルに追記"""
+
+    @abstractmethod
+    def _finish(self):
+        """結果ファイルを閉じる（1行も書き込んでいない場合も空のファイルを作成）"""
+
+    @abstractmethod
+    def _discard(self):
+        """書き込み中のファイルを閉じる（結果ファイルを作成済みならTrue）"""
+
+
+class CsvResultWriter(ColumnarResultWriter):
+    """CSV形式（UTF-8 BOM付き、Excelでそのまま開ける）"""
+
+    def __init__(self, output_path):
+        super().__init__(output_path)
+        self.header_written = False
+
+    def _write_chunk(self, df):
+        if self.header_written:
+            df.to_csv(
+                self.output_path, mode="a", header=False, index=False, encoding="utf-8"
+            )
+        else:
+            df.to_csv(self.output_path, index=False, encoding="utf-8-sig")
+            self.header_written = True
+
+    def _finish(self):
+        if not self.header_written:
+            open(self.output_path, "w", encoding="utf-8-sig").close()
+
+    def _discard(self):
+        return self.header_written
+
+
+class ArrowResultWriter(ColumnarResultWriter):
+    """
+    Parquet / Feather（Arrow IPC）形式（要pyarrow）
+
+    数値と文字列が混在する列（Excelの検索キー等）はkey_stringsと同じ規則で文字列にする。
+    text_cols: チャンクごとに型が変わりうるため常に文字列で保存する列（検索キー列など）
+    """
+
+    def __init__(self, output_path, output_format, text_cols=()):
+        super().__init__(output_path)
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError(
+                f"{output_format}形式での保存にはpyarrowが必要です（pip install pyarrow）"
+            )
+        self.pa = pyarrow
+        self.output_format = output_format
+        self.text_cols = set(text_cols)
+        self.schema = None
+        self.writer = None
+
+    def _text_columns(self, df):
+        """文字列で保存する列を文字列化したDataFrameと、その列名（Arrowの列名）の集合"""
+        text_cols = set()
+        for col in df.columns:
+            values = df[col]
+            if col in self.text_cols:
+                text_cols.add(col)
+            elif self.schema is not None:
+                # 先頭チャンクで文字列にした列は以降のチャンクも文字列
+                if self.pa.types.is_string(self.schema.field(str(col)).type):
+                    text_cols.add(col)
+            elif values.dtype == object and key_kind(values) == "mixed":
+                text_cols.add(col)
+        if not text_cols:
+            return df, text_cols
+        df = df.copy(deep=False)
+        for col in text_cols:
+            df[col] = key_strings(df[col]).astype(object)
+        return df, {str(col) for col in text_cols}
+
+    def _write_chunk(self, df):
+        pa = self.pa
+        df, text_cols = self._text_columns(df)
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        if self.writer is None:
+            # 先頭チャンクのスキーマで以降のチャンクもそろえる（文字列化した列は文字列型）
+            self.schema = pa.schema(
+                [
+                    pa.field(field.name, pa.string()) if field.name in text_cols else field
+                    for field in table.schema
+                ],
+                metadata=table.schema.metadata,
+            )
+            table = table.cast(self.schema)
+            if self.output_format == "parquet":
+                import pyarrow.parquet
+
+                self.writer = pyarrow.parquet.ParquetWriter(
+                    self.output_path, self.schema
+                )
+            else:
+                import pyarrow.ipc
+
+                self.writer = pyarrow.ipc.new_file(self.output_path, self.schema)
+        self.writer.write_table(table)
+
+    def _finish(self):
+        import pandas as pd
+
+        if self.writer is None:
+            self._write_chunk(pd.DataFrame())
+        self.writer.close()
+
+    def _discard(self):
+        if self.writer is None:
+            return False
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+        return True
+
+
+# 結果の出力方法
+# new: 結果を新しいファイルに出力（既定）
+# inject: Excel1の元ブックをコピーし、対象シートに取得列だけを追加（書式・数式・他シートを保持）
+OUTPUT_MODES = ("new", "inject")
+
+# 結果ファイルの出力形式と拡張子
+OUTPUT_FORMATS = {
+    "xlsx": ".xlsx",
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+}
+
+
+def remove_partial_file(path):
+    """作成途中のファイルを削除（存在しない・削除できない場合は何もしない）"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def parse_verbosity(value):
+    """表示レベルを数値に変換（"quiet" / "normal" / "detail" または 0〜2）"""
+    if isinstance(value, str):
+        if value not in VERBOSITY_LEVELS:
+            raise ValueError(
+                f"不明なverbosityです: {value}（{', '.join(VERBOSITY_LEVELS)}）"
+            )
+        return VERBOSITY_LEVELS[value]
+    return max(VERBOSITY_QUIET, min(int(value), VERBOSITY_DETAIL))
+
+
+def open_result_writer(
+    output_path, writer_engine="stream", output_format="xlsx", text_cols=()
+):
+    """
+    逐次書き込み用のライターを作成（output_formatがxlsx以外ならその形式）
+    text_cols: Parquet / Featherで常に文字列として保存する列
+    """
+    if output_format == "csv":
+        return CsvResultWriter(output_path)
+    if output_format in ("parquet", "feather"):
+        return ArrowResultWriter(output_path, output_format, text_cols)
+    if output_format != "xlsx":
+        raise ValueError(
+            f"不明なoutput_formatです: {output_format}（{', '.join(OUTPUT_FORMATS)}）"
+        )
+
+    if writer_engine == "xlsxwriter":
+        return XlsxwriterStreamingWriter(output_path)
+    if writer_engine in ("stream", "openpyxl"):
+        return StreamingExcelWriter(output_path)
+    raise ValueError(
+        f"不明なwriter_engineです: {writer_engine}（{', '.join(WRITER_ENGINES)}）"
+    )
+
+
+def key_kind(values):
+    """検索キーの種類を判定（"number" / "string" / "datetime" / "mixed"）"""
+    import pandas as pd
+
+    dtype = values.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return "mixed"
+    if pd.api.types.is_numeric_dtype(dtype):
+        return "number"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if isinstance(dtype, pd.StringDtype):
+        return "string"
+    if isinstance(dtype, pd.CategoricalDtype):
+        return key_kind(pd.Series(dtype.categories))
+
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred in ("string", "empty"):
+        return "string"
+    if inferred in ("integer", "floating", "mixed-integer-float", "decimal"):
+        return "number"
+    if inferred in ("datetime", "datetime64", "date"):
+        return "datetime"
+    return "mixed"
+
+
+def key_strings(values):
+    """
+    検索キーを文字列のCategoricalに変換
+
+    文字列化はユニーク値に対してのみ行い、行ごとの文字列は作成しない。
+    Excelで小数として読み込まれた整数キー（1.0）は"1"にそろえる
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values)
+
+    if pd.api.types.is_float_dtype(uniques.dtype):
+        uniques = np.asarray(uniques)
+        integral = np.isfinite(uniques) & (uniques == np.floor(uniques))
+        strings = np.where(
+            integral,
+            np.where(integral, uniques, 0).astype("int64").astype(str),
+            uniques.astype(str),
+        )
+    else:
+        strings = [
+            str(int(value))
+            if isinstance(value, float) and value.is_integer()
+            else str(value)
+            for value in uniques
+        ]
+
+    # 文字列化で同じになった値（1と"1"など）は同じカテゴリにまとめる
+    string_codes, categories = pd.factorize(pd.Index(strings, dtype=object))
+    if len(string_codes):
+        # すべて空欄（ユニーク値なし）の場合はコードが全て-1のまま
+        codes = np.where(codes >= 0, string_codes[np.maximum(codes, 0)], -1)
+    return pd.Categorical.from_codes(codes, categories=categories)
+
+
+def key_columns(col):
+    """検索キー列の指定（列名または列名のリスト）を列名のリストに変換"""
+    if isinstance(col, (list, tuple)):
+        return list(col)
+    return [col]
+
+
+def master_configs(config):
+    """
+    照合するマスタごとの設定のリスト（mastersの指定順）
+
+    masters未指定時はExcel2のみ。各要素の項目（excel2_path, excel2_sheet, lookup_col等）で
+    configを上書きした設定を返す
+    """
+    entries = config.get("masters")
+    if not entries:
+        return [config]
+    return [dict(config, **entry) for entry in entries]
+
+
+def check_master_columns(masters):
+    """複数マスタの取得列が揃っているか確認（不一致は例外）"""
+    return_cols = list(masters[0].return_cols)
+    for master in masters[1:]:
+        if list(master.return_cols) != return_cols:
+            raise ValueError(
+                f"マスタごとの取得列が一致しません: {return_cols} / {master.return_cols}"
+            )
+
+
+def duplicate_sheet(masters):
+    """
+    重複キーシート用のDataFrame（いずれのマスタにも重複がなければNone）
+
+    複数マスタの場合は先頭にマスタ列を追加して結合
+    """
+    import pandas as pd
+
+    reports = [master for master in masters if master.duplicates is not None]
+    if not reports:
+        return None
+    if len(masters) == 1:
+        return reports[0].duplicates
+    frames = []
+    for master in reports:
+        frame = master.duplicates.copy()
+        frame.insert(0, "マスタ", master_label(master))
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def master_label(master):
+    """処理サマリー・ログ用のマスタ表示名"""
+    return f"{os.path.basename(str(master.source_path))} - {master.sheet_name}"
+
+
+def range_columns(config):
+    """期間照合の(開始日列, 終了日列)を設定から取得（date_range以外はNone）"""
+    if config.get("match_mode") != "date_range":
+        return None
+    missing = [key for key in ("date_col", "start_col", "end_col") if not config.get(key)]
+    if missing:
+        raise ValueError(f"期間照合（date_range）には{missing}の指定が必要です")
+    return (config["start_col"], config["end_col"])
+
+
+def split_periods(table):
+    """
+    キーごとの期間（group, start, end, position）を重ならない区間に分割
+
+    各日付には、その日付を含む期間のうち開始日が最も遅い行を割り当てる
+    （開始日が同じ場合は先頭の行）。endが欠損値の期間は終了日なし。
+    期間が重ならない場合は元の期間がそのまま区間になる
+    """
+    import numpy as np
+    import pandas as pd
+
+    open_end = np.iinfo(np.int64).max
+    table = table.sort_values(
+        ["group", "start", "position"], ascending=[True, True, False]
+    )
+    starts = table["start"].to_numpy("datetime64[ns]").view(np.int64)
+    ends = table["end"].to_numpy("datetime64[ns]").view(np.int64).copy()
+    ends[table["end"].isna().to_numpy()] = open_end
+
+    segments = []
+    stack = []  # 有効な期間の(終了日, 行位置)。末尾が開始日の最も遅い期間
+    group = cursor = None
+
+    def close_until(until):
+        # untilより前に終わる期間を区間として確定（隠れていた期間は残りの日付だけ）
+        nonlocal cursor
+        while stack and stack[-1][0] < until:
+            end, position = stack.pop()
+            if cursor <= end:
+                segments.append((group, cursor, end, position))
+                cursor = end + 1
+
+    def close_group():
+        close_until(open_end)
+        if stack:
+            # 終了日なしの期間（開始日が最も遅いもの）が以降すべてに該当
+            segments.append((group, cursor, open_end, stack[-1][1]))
+        stack.clear()
+
+    for row_group, start, end, position in zip(
+        table["group"].to_numpy(), starts, ends, table["position"].to_numpy()
+    ):
+        if row_group != group:
+            if group is not None:
+                close_group()
+            group = row_group
+        else:
+            close_until(start)
+            if stack and cursor < start:
+                segments.append((group, cursor, start - 1, stack[-1][1]))
+        cursor = start
+        if end >= start:
+            stack.append((end, position))
+    if group is not None:
+        close_group()
+
+    segments = np.array(segments, dtype=np.int64).reshape(-1, 4)
+    ends = segments[:, 2]
+    ends[ends == open_end] = np.iinfo(np.int64).min  # 終了日なしはNaT
+    return pd.DataFrame(
+        {
+            "group": segments[:, 0],
+            "start": segments[:, 1].view("datetime64[ns]"),
+            "end": ends.view("datetime64[ns]"),
+            "position": segments[:, 3].astype(np.intp),
+        }
+    )
+
+
+def parse_key_normalize(value):
+    """
+    key_normalize設定を正規化手順のタプルに変換（未指定の場合は空のタプル）
+
+    True: DEFAULT_KEY_NORMALIZE、文字列・リスト: KEY_NORMALIZE_STEPSの手順名
+    """
+    if not value:
+        return ()
+    if value is True:
+        return DEFAULT_KEY_NORMALIZE
+    if isinstance(value, str):
+        value = [value]
+
+    steps = {}
+    for step in value:
+        name, _, width = str(step).partition(":")
+        if name not in KEY_NORMALIZE_STEPS:
+            raise ValueError(
+                f"不明なkey_normalizeです: {step}（{', '.join(KEY_NORMALIZE_STEPS)}）"
+            )
+        if name == "zfill":
+            if not width.isdigit():
+                raise ValueError('zfillは桁数を指定してください（例: "zfill:6"）')
+            step = f"zfill:{int(width)}"
+        steps[name] = step
+    return tuple(steps[name] for name in KEY_NORMALIZE_STEPS if name in steps)
+
+
+def normalize_keys(values, steps):
+    """
+    検索キーを正規化した文字列のCategoricalに変換
+
+    正規化はユニーク値に対するpandasの文字列演算でまとめて行う（行ごとの処理はしない）。
+    正規化で空文字になったキーは空欄として扱う
+    """
+    import numpy as np
+    import pandas as pd
+
+    strings = key_strings(values)
+    categories = pd.Series(strings.categories, dtype=object)
+    for step in steps:
+        name, _, width = step.partition(":")
+        if name == "nfkc":
+            categories = categories.str.normalize("NFKC")
+        elif name == "strip":
+            categories = categories.str.strip()
+        elif name == "casefold":
+            categories = categories.str.casefold()
+        elif name == "remove_hyphen":
+            categories = categories.str.replace(HYPHEN_PATTERN, "", regex=True)
+        elif name == "zfill":
+            digits = categories.str.fullmatch(r"\d+").astype(bool)
+            categories = categories.where(~digits, categories.str.zfill(int(width)))
+    categories = categories.where(categories != "")
+
+    # 正規化で同じになったキーは同じカテゴリにまとめる
+    normalized_codes, normalized = pd.factorize(categories)
+    codes = strings.codes
+    if len(normalized_codes):
+        codes = np.where(codes >= 0, normalized_codes[np.maximum(codes, 0)], -1)
+    return pd.Categorical.from_codes(codes, categories=normalized)
+
+
+def parse_duplicate_policy(value):
+    """duplicate_policy設定を"first", "aggregate:sum"等の形式に変換（未指定の場合は"first"）"""
+    if not value:
+        return "first"
+    policy, _, method = str(value).strip().lower().partition(":")
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(
+            f"不明なduplicate_policyです: {value}（{', '.join(DUPLICATE_POLICIES)}）"
+        )
+    if policy != "aggregate":
+        if method:
+            raise ValueError(f"集約方法はaggregateでのみ指定できます: {value}")
+        return policy
+    method = method or "concat"
+    if method not in DUPLICATE_AGGREGATES:
+        raise ValueError(
+            f"不明な集約方法です: {method}（{', '.join(DUPLICATE_AGGREGATES)}）"
+        )
+    return f"aggregate:{method}"
+
+
+def join_values(df, key_cols, col):
+    """
+    キーごとに列の値を連結したSeries（空欄を除き、同じ値は1回だけ・出現順）
+
+    重複除去・文字列化は全行まとめて行い、キーごとの処理は文字列の連結のみ
+    （groupby.aggのグループごとのSeries作成を避ける）
+    """
+    import pandas as pd
+
+    values = df[key_cols + [col]].dropna(subset=[col]).drop_duplicates()
+    grouped = values.groupby(key_cols, sort=False)
+    joined = [[] for _ in range(grouped.ngroups)]
+    for code, text in zip(grouped.ngroup(), values[col].astype(str)):
+        joined[code].append(text)
+    return pd.Series(
+        [DUPLICATE_CONCAT_SEPARATOR.join(texts) for texts in joined],
+        index=grouped.size().index,
+        dtype=object,
+    )
+
+
+def duplicate_report(duplicates, key_cols, value_cols):
+    """
+    重複キーのレポート（キーごとの件数・値の相違・重複している値）
+
+    duplicates: 重複キーを持つ行だけのDataFrame
+    """
+    grouped = duplicates.groupby(key_cols, sort=False)
+    report = grouped.size().rename("重複件数").to_frame()
+    value_cols = [col for col in value_cols if col not in key_cols]
+    conflict = grouped[value_cols].nunique(dropna=False).gt(1).any(axis=1)
+    report["値の相違"] = conflict.map({True: "あり", False: "なし"})
+    for col in value_cols:
+        report[f"{col}（重複値）"] = join_values(duplicates, key_cols, col)
+    return report.reset_index()
+
+
+def resolve_duplicates(df, key_cols, return_cols, policy="first"):
+    """
+    キーの重複をduplicate_policyに従って解消
+
+    重複判定はキー列の1回のハッシュ処理で行い、重複がなければそのまま返す。
+    戻り値は(キーの重複がないDataFrame, 重複キーのレポート（重複がなければNone）)
+    """
+    import pandas as pd
+    from pandas.api.types import is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype
+
+    duplicated = df.duplicated(subset=key_cols, keep=False)
+    if not duplicated.any():
+        return df, None
+
+    duplicates = df[duplicated]
+    report = duplicate_report(duplicates, key_cols, return_cols)
+    if policy == "error":
+        keys = report[key_cols].head(5).itertuples(index=False, name=None)
+        raise ValueError(
+            f"マスタに重複キーが{len(report)}件あります（duplicate_policy=error）: "
+            f"{[key[0] if len(key) == 1 else key for key in keys]}"
+        )
+    if policy in ("first", "last"):
+        return df[~df.duplicated(subset=key_cols, keep=policy)], report
+
+    # 重複行だけをキーごとに集約し、重複のない行と結合
+    method = policy.partition(":")[2]
+    grouped = duplicates.groupby(key_cols, sort=False)
+    columns = {}
+    for col in df.columns:
+        if col in key_cols:
+            continue
+        values = duplicates[col]
+        numeric = is_numeric_dtype(values) and not is_bool_dtype(values)
+        if col not in return_cols:
+            # 期間照合の終了日列などは先頭行の値
+            columns[col] = grouped[col].first()
+        elif method == "sum" and numeric:
+            columns[col] = grouped[col].sum(min_count=1)
+        elif method == "max" and (numeric or is_datetime64_any_dtype(values)):
+            columns[col] = grouped[col].max()
+        else:
+            columns[col] = join_values(duplicates, key_cols, col)
+    # 値がすべて空欄のキーも残すため、キーの一覧に揃える
+    aggregated = pd.DataFrame(columns, index=grouped.size().index)
+    aggregated = aggregated.reset_index()[list(df.columns)]
+    return pd.concat([df[~duplicated], aggregated], ignore_index=True), report
+
+
+def read_sheet_columns(book, sheet_name, usecols):
+    """
+    openpyxl（read_only）で開いたブックのシートから指定列だけをDataFrameに読み込む
+
+    シートのXMLは行ごとに読み進めるが、セル値の変換はヘッダー行と指定列のセルだけに行う
+    （pandas.read_excelのusecolsは全セルを変換してから列を絞り込む）。
+    値の変換・空行の扱い・型推定はpandas.read_excel（header=0）と同じ。
+    usecolsのうちヘッダーに存在しない列は結果に含まれない
+    openpyxl・pandasの内部APIを使用するため、ライブラリ更新で例外になる場合がある
+    （read_excel_sheetは例外時にpandas.read_excelでの読み込みに切り替える）
+    """
+    import numpy as np
+    from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+    from openpyxl.worksheet._reader import CELL_TAG, ROW_TAG, VALUE_TAG, WorkSheetParser
+    from openpyxl.xml.functions import iterparse
+    from pandas.io.parsers import TextParser
+
+    ws = book[sheet_name]
+    source = ws._get_source()
+    cell_parser = WorkSheetParser(
+        source,
+        ws._shared_strings,
+        data_only=book.data_only,
+        epoch=book.epoch,
+        date_formats=book._date_formats,
+        timedelta_formats=book._timedelta_formats,
+    )
+
+    def convert(element):
+        # pandasのopenpyxl読み込み（_convert_cell）と同じ変換
+        cell = cell_parser.parse_cell(element)
+        value = cell["value"]
+        if value is None:
+            return cell["column"], ""
+        if cell["data_type"] == TYPE_ERROR:
+            return cell["column"], np.nan
+        if cell["data_type"] == TYPE_NUMERIC and int(value) == value:
+            return cell["column"], int(value)
+        return cell["column"], value
+
+    def has_value(element):
+        return bool(element.findtext(VALUE_TAG)) or element.get("t") == "inlineStr"
+
+    data = []
+    positions = None
+    last_row_with_data = -1
+    row_number = 0
+    try:
+        for _, element in iterparse(source):
+            if element.tag != ROW_TAG:
+                continue
+            row_attr = element.get("r")
+            row_number = int(float(row_attr)) if row_attr else row_number + 1
+            cell_parser.row_counter = row_number
+            cell_parser.col_counter = 0
+            # 欠けている行は空行として補う
+            data.extend([] for _ in range(row_number - 1 - len(data)))
+
+            if positions is None:
+                # ヘッダー行: 全セルを変換して読み込む列の位置を決定
+                cells = dict(convert(cell) for cell in element.iter(CELL_TAG))
+                # 空のヘッダーはpandasと同じ「Unnamed: n」として扱う
+                header = [
+                    cells.get(col, "") if cells.get(col, "") != "" else f"Unnamed: {col - 1}"
+                    for col in range(1, max(cells, default=0) + 1)
+                ]
+                wanted = set(usecols)
+                positions = {}
+                for i, name in enumerate(header, 1):
+                    if name in wanted and name not in positions:
+                        positions[name] = i
+                positions = sorted(positions.values())
+                wanted_cols = set(positions)
+                values = [header[i - 1] for i in positions]
+            else:
+                cells = {}
+                for cell in element:
+                    coordinate = cell.get("r")
+                    if coordinate:
+                        column = cell_parser.col_counter = _column_number(coordinate)
+                        if column not in wanted_cols:
+                            continue
+                    column, value = convert(cell)
+                    if column in wanted_cols:
+                        cells[column] = value
+                values = [cells.get(col, "") for col in positions]
+
+            if any(value != "" for value in values) or any(
+                has_value(cell) for cell in element
+            ):
+                last_row_with_data = len(data)
+            data.append(values)
+            element.clear()
+    finally:
+        source.close()
+
+    # 末尾の空行を除き、空行は指定列の幅に揃える
+    data = data[: last_row_with_data + 1]
+    width = len(positions or ())
+    data = [row if row else [""] * width for row in data]
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+
+def _column_number(coordinate):
+    """セル座標（"AB12"）の列番号（1始まり）"""
+    number = 0
+    for char in coordinate:
+        if char.isdigit():
+            break
+        number = number * 26 + ord(char) - 64
+    return number
+
+
+def dataframe_rows(df, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    DataFrameの各行をExcel書き込み用のタプルで返す（欠損値は空セル）
+    object型への変換はchunk_size行ずつ行い、全体の複製を作らない
+    """
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start : start + chunk_size]
+        values = chunk.astype(object).where(chunk.notna(), None)
+        yield from values.itertuples(index=False, name=None)
+
+
+def reset_peak_memory():
+    """
+    プロセスの最大メモリ使用量（VmHWM）をリセット
+    Linuxのみ対応（/proc/self/clear_refs）。リセットできた場合はTrue
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def default_cache_dir():
+    """
+    マスタキャッシュの既定保存先（ユーザーごとのディレクトリ）
+
+    キャッシュはpickleで保存するため、共有ドライブなど他のユーザーが書き込める
+    場所には置かない。Windowsは%LOCALAPPDATA%、その他は$XDG_CACHE_HOMEまたは~/.cache
+    """
+    if os.name == "nt" and os.environ.get("LOCALAPPDATA"):
+        base_dir = os.environ["LOCALAPPDATA"]
+    else:
+        base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+    return os.path.join(base_dir, MASTER_CACHE_DIRNAME)
+
+
+def peak_memory_mb():
+    """
+    プロセスの最大メモリ使用量（MB、取得できない環境ではNone）
+    LinuxではVmHWM（reset_peak_memory以降の最大値）、その他は起動以降の最大値
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # LinuxはKB単位、macOSはバイト単位
+    if sys.platform == "darwin":
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class VlookupResult:
+    """
+    VLOOKUP実行結果（成否・件数・処理段階ごとの計測値）
+
+    真偽値として評価すると成否を返すため、従来のTrue/Falseの戻り値と同じように使える
+    """
+
+    def __init__(self, trace_memory=False):
+        self.success = False
+        self.output_path = None
+        self.total_count = None
+        self.matched_count = None
+        self.master_hits = None
+        self.error = None
+        self.started_at = datetime.now()
+        self.stages = []
+        self.trace_memory = trace_memory
+        self._current = None
+        self._started_tracing = False
+
+    def begin_stage(self, name):
+        """処理段階の計測を開始（計測中の段階があれば終了する）"""
+        self.end_stage()
+        if self.trace_memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        # リセットできない環境では最大メモリはプロセス起動以降の累計値
+        scope = "stage" if reset_peak_memory() else "process"
+        self._current = (name, time.perf_counter(), time.process_time(), scope)
+
+    def end_stage(self):
+        """計測中の段階を終了して記録"""
+        if self._current is None:
+            return
+        name, wall_start, cpu_start, scope = self._current
+        self._current = None
+        stage = {
+            "stage": name,
+            "wall_sec": round(time.perf_counter() - wall_start, 6),
+            "cpu_sec": round(time.process_time() - cpu_start, 6),
+            "peak_rss_mb": peak_memory_mb(),
+            # "stage": 段階内の最大値, "process": プロセス起動以降の累計最大値
+            "peak_rss_scope": scope,
+        }
+        if self.trace_memory:
+            import tracemalloc
+
+            stage["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        self.stages.append(stage)
+
+    def finish(self, success, error=None):
+        """計測を終了して結果を確定"""
+        self.end_stage()
+        if self._started_tracing:
+            import tracemalloc
+
+            tracemalloc.stop()
+            self._started_tracing = False
+        self.success = bool(success)
+        self.error = error
+        return self
+
+    @property
+    def total_wall_sec(self):
+        return sum(stage["wall_sec"] for stage in self.stages)
+
+    def summary_rows(self):
+        """処理サマリーシート用の行（項目, 値）"""
+        rows = []
+        for stage in self.stages:
+            value = f"{stage['wall_sec']:.3f}秒（CPU {stage['cpu_sec']:.3f}秒"
+            if stage["peak_rss_mb"] is not None:
+                label = "最大メモリ"
+                if stage["peak_rss_scope"] != "stage":
+                    label += "（プロセス累計）"
+                value += f", {label} {stage['peak_rss_mb']:.1f}MB"
+            if "peak_traced_mb" in stage:
+                value += f", 段階内ピーク {stage['peak_traced_mb']:.1f}MB"
+            rows.append([f"処理時間: {stage['stage']}", value + "）"])
+        return rows
+
+    def to_dict(self):
+        return {
+            "success": self.success,
+            "output_path": self.output_path,
+            "total_count": self.total_count,
+            "matched_count": self.matched_count,
+            "master_hits": self.master_hits,
+            "error": self.error,
+            "started_at": self.started_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "total_wall_sec": round(self.total_wall_sec, 6),
+            "stages": self.stages,
+        }
+
+    def write_json(self, path):
+        """計測結果をJSONファイルに保存"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2, default=str)
+        return path
+
+    def __bool__(self):
+        return self.success
+
+    def __repr__(self):
+        return (
+            f"VlookupResult(success={self.success}, output_path={self.output_path!r}, "
+            f"total_count={self.total_count}, matched_count={self.matched_count})"
+        )
 
 
 class ExcelSheetVLOOKUP:
-    def __init__(self):
+    def __init__(self, verbosity="detail"):
         self.excel1_df = None
         self.excel2_df = None
         self.result_df = None
+        self.verbosity = parse_verbosity(verbosity)
+        self._workbooks = {}
+        self._reuse_workbooks = 0
 
-    def read_excel_sheet(self, file_path, sheet_name):
-        """Excelファイルの指定シートを読み込み"""
-        try:
+    def log(self, message="", level=VERBOSITY_NORMAL):
+        """表示レベルがlevel以上の場合のみメッセージを表示"""
+        if self.verbosity >= level:
+            print(message)
+
+    @property
+    def detail(self):
+        """プレビュー・診断表示を行うか（quiet/normalでは表示用の計算自体を省略）"""
+        return self.verbosity >= VERBOSITY_DETAIL
+
+    def open_workbook(self, file_path):
+        """
+        Excelファイルを開く
+        同じファイルは一度だけ開き、シート一覧取得・データ読み込みでハンドルを再利用
+        """
+        import pandas as pd
+
+        key = os.path.abspath(file_path)
+        xl_file = self._workbooks.get(key)
+        if xl_file is None:
             # ファイル存在確認
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"ファイルが見つかりません: {file_path}")
-
-            # シート一覧取得
             xl_file = pd.ExcelFile(file_path)
+            self._workbooks[key] = xl_file
+        return xl_file
+
+    def close_workbooks(self):
+        """開いているExcelファイルをすべて閉じる"""
+        for xl_file in self._workbooks.values():
+            xl_file.close()
+        self._workbooks.clear()
+
+    @contextmanager
+    def reusing_workbooks(self):
+        """
+        ブロック内ではread_excel_sheetで開いたファイルを閉じずに再利用し、
+        ブロックを抜けるときにまとめて閉じる（入れ子の場合は最も外側で閉じる）
+        """
+        self._reuse_workbooks += 1
+        try:
+            yield self
+        finally:
+            self._reuse_workbooks -= 1
+            if not self._reuse_workbooks:
+                self.close_workbooks()
+
+    def read_excel_sheet(self, file_path, sheet_name, usecols=None, missing_ok=False):
+        """
+        Excelファイルの指定シートを読み込み
+
+        usecols: 読み込む列名のリスト（省略時は全列）
+                 xlsx/xlsmでは指定外の列のセル値を変換せず、DataFrameにも取り込まない
+                 （シートのXML自体は全体を読み進める）
+        missing_ok: Trueの場合、usecolsのうち存在しない列は無視する
+        ここで開いたファイルは読み込み後に閉じる（reusing_workbooks内では開いたまま再利用）
+        """
+        key = os.path.abspath(file_path)
+        opened_here = key not in self._workbooks
+        try:
+            # シート一覧取得（開いたハンドルをそのまま読み込みにも使用）
+            xl_file = self.open_workbook(file_path)
             sheet_names = xl_file.sheet_names
-            print(f"利用可能なシート: {sheet_names}")
+            self.log(f"利用可能なシート: {sheet_names}", VERBOSITY_DETAIL)
 
             # シート名確認
             if sheet_name not in sheet_names:
-                print(f"警告: シート'{sheet_name}'が見つかりません")
-                print(f"利用可能なシート: {sheet_names}")
+                self.log(f"警告: シート'{sheet_name}'が見つかりません", VERBOSITY_QUIET)
+                self.log(f"利用可能なシート: {sheet_names}")
                 # 最初のシートを使用
                 sheet_name = sheet_names[0]
-                print(f"代わりに'{sheet_name}'シートを使用します")
+                self.log(f"代わりに'{sheet_name}'シートを使用します")
 
             # データ読み込み
-            df = pd.read_excel(file_path, sheet_name=sheet_name)
-            print(f"読み込み完了: {file_path} - {sheet_name}")
-            print(f"データサイズ: {df.shape[0]}行 x {df.shape[1]}列")
-            print(f"列名: {list(df.columns)}")
+            df = None
+            if usecols is None:
+                df = xl_file.parse(sheet_name)
+            elif xl_file.engine == "openpyxl":
+                # 指定外の列のセルは値を変換しない
+                try:
+                    df = read_sheet_columns(xl_file.book, sheet_name, usecols)
+                except Exception as e:
+                    # openpyxl/pandasの内部APIを使うため、失敗時は通常の読み込みに切り替え
+                    self.log(f"列指定の読み込みに失敗したため全列を読み込みます: {e}")
+            if df is None:
+                wanted = set(usecols)
+                df = xl_file.parse(sheet_name, usecols=lambda col: col in wanted)
+
+            if usecols is not None:
+                missing_cols = [col for col in usecols if col not in df.columns]
+                if missing_cols and not missing_ok:
+                    # エラー時のみヘッダー行を読み直して利用可能な列を表示
+                    available_cols = list(xl_file.parse(sheet_name, nrows=0).columns)
+                    raise ValueError(
+                        f"列{missing_cols}が存在しません。利用可能な列: {available_cols}"
+                    )
+
+            self.log(f"読み込み完了: {file_path} - {sheet_name}")
+            self.log(f"データサイズ: {df.shape[0]}行 x {df.shape[1]}列")
+            if self.detail:
+                self.log(f"列名: {list(df.columns)}", VERBOSITY_DETAIL)
 
             return df
 
         except Exception as e:
-            print(f"読み込みエラー: {e}")
+            self.log(f"読み込みエラー: {e}", VERBOSITY_QUIET)
             return None
 
-    def generate_output_path(self, excel1_path, suffix="vlookup_result"):
+        finally:
+            if opened_here and not self._reuse_workbooks and key in self._workbooks:
+                self._workbooks.pop(key).close()
+
+    def iter_excel_sheet(
+        self, file_path, sheet_name, chunk_size=DEFAULT_CHUNK_SIZE, usecols=None
+    ):
+        """
+        Excelファイルの指定シートをストリーミング読み込み
+
+        openpyxlのread_onlyモードで1行ずつ読み、chunk_size行ごとに
+        DataFrameを返すジェネレータ。巨大なシートでもメモリ使用量を一定に保つ
+        """
+        import pandas as pd
+        from openpyxl import load_workbook
+
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f"ファイルが見つかりません: {file_path}")
+
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet_names = wb.sheetnames
+            if sheet_name not in sheet_names:
+                self.log(f"警告: シート'{sheet_name}'が見つかりません", VERBOSITY_QUIET)
+                self.log(f"利用可能なシート: {sheet_names}")
+                sheet_name = sheet_names[0]
+                self.log(f"代わりに'{sheet_name}'シートを使用します")
+
+            rows = wb[sheet_name].iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            header = [
+                col if col is not None else f"Unnamed: {i}"
+                for i, col in enumerate(header)
+            ]
+
+            # 読み込む列の位置を決定
+            if usecols is None:
+                columns = header
+            else:
+                missing_cols = [col for col in usecols if col not in header]
+                if missing_cols:
+                    raise ValueError(
+                        f"列{missing_cols}が存在しません。利用可能な列: {header}"
+                    )
+                wanted = set(usecols)
+                columns = [col for col in header if col in wanted]
+            positions = [header.index(col) for col in columns]
+
+            self.log(f"ストリーミング読み込み開始: {file_path} - {sheet_name}")
+            self.log(f"チャンクサイズ: {chunk_size}行")
+
+            batch = []
+            yielded = False
+            blank_rows = 0
+            blank_row = (None,) * len(positions)
+            for row in rows:
+                # 途中の空行は欠損値の行として残し、末尾の空行は除く
+                # （pandas.read_excelと同じ扱い）
+                if all(value is None for value in row):
+                    blank_rows += 1
+                    continue
+                pending = [blank_row] * blank_rows + [
+                    tuple(row[i] if i < len(row) else None for i in positions)
+                ]
+                blank_rows = 0
+                for record in pending:
+                    batch.append(record)
+                    if len(batch) >= chunk_size:
+                        yield pd.DataFrame.from_records(batch, columns=columns)
+                        yielded = True
+                        batch = []
+
+            if batch or not yielded:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+
+        finally:
+            wb.close()
+
+    def master_cache_key(
+        self,
+        file_path,
+        sheet_name,
+        columns,
+        cache_dir=None,
+        use_hash=False,
+        duplicate_policy="first",
+    ):
+        """
+        マスタキャッシュの保存パスと検証用シグネチャを作成
+
+        保存パスは(ファイルパス, シート名, 列, 重複キーの扱い)で決まり、シグネチャは
+        更新日時+サイズ（use_hash=Trueの場合はファイル内容のSHA-256）
+        """
+        abs_path = os.path.abspath(file_path)
+        key_source = json.dumps(
+            [abs_path, sheet_name, [str(col) for col in columns], duplicate_policy],
+            ensure_ascii=False,
+        )
+        digest = hashlib.sha1(key_source.encode("utf-8")).hexdigest()[:16]
+
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        cache_path = os.path.join(cache_dir, f"{base_name}_{digest}.pkl")
+
+        if use_hash:
+            sha256 = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(block)
+            signature = {"sha256": sha256.hexdigest()}
+        else:
+            stat = os.stat(file_path)
+            signature = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+        return cache_path, signature
+
+    def load_master_cache(self, cache_path, signature):
+        """
+        マスタキャッシュ読み込み（存在しない・ファイル更新済みの場合はNone）
+
+        戻り値は(整形済みマスタ, 重複キーのレポート)
+        """
+        if not os.path.exists(cache_path):
+            return None
+        if hasattr(os, "getuid"):
+            # 他のユーザーが作成・変更できるファイルはpickleとして読み込まない
+            stat = os.stat(cache_path)
+            if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+                self.log(
+                    f"   キャッシュの所有者・権限が不正なため使用しません: {cache_path}",
+                    VERBOSITY_QUIET,
+                )
+                return None
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+        except Exception as e:
+            self.log(f"   キャッシュ読み込みエラー（再作成します）: {e}", VERBOSITY_QUIET)
+            return None
+
+        if cached.get("signature") != signature:
+            self.log(f"   マスタファイルが更新されているためキャッシュを再作成します")
+            return None
+        return cached["data"], cached.get("duplicates")
+
+    def save_master_cache(self, cache_path, signature, df, duplicates=None):
+        """マスタキャッシュ保存（重複キーのレポートも保存。一時ファイル経由で置き換え）"""
+        try:
+            # 他のユーザーから読み書きできないディレクトリに保存
+            os.makedirs(os.path.dirname(cache_path), mode=0o700, exist_ok=True)
+            tmp_path = f"{cache_path}.tmp"
+            # umaskに関係なく本人のみ読み書きできるファイルとして作成
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(
+                    {"signature": signature, "data": df, "duplicates": duplicates},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, cache_path)
+            self.log(f"   マスタキャッシュ保存: {cache_path}")
+        except Exception as e:
+            self.log(f"   キャッシュ保存エラー: {e}", VERBOSITY_QUIET)
+
+    def generate_output_path(self, excel1_path, suffix="vlookup_result", extension=".xlsx"):
         """
         入力ファイルと同じディレクトリに出力ファイルパスを生成
         """
@@ -56,217 +1832,1169 @@ class ExcelSheetVLOOKUP:
 
         # タイムスタンプ付きファイル名生成
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"{base_name}_{suffix}_{timestamp}.xlsx"
+        output_filename = f"{base_name}_{suffix}_{timestamp}{extension}"
         output_path = os.path.join(dir_path, output_filename)
 
         # 重複回避（同じ秒に複数実行された場合）
         counter = 1
         while os.path.exists(output_path):
-            output_filename = f"{base_name}_{suffix}_{timestamp}_{counter:02d}.xlsx"
+            output_filename = f"{base_name}_{suffix}_{timestamp}_{counter:02d}{extension}"
             output_path = os.path.join(dir_path, output_filename)
             counter += 1
 
         return output_path
 
+    def build_summary(
+        self, output_path, total_count, matched_count=None, metrics=None, master_hits=None
+    ):
+        """
+        処理サマリーシート用のDataFrameを作成
+
+        metrics: VlookupResultを指定すると、完了済みの処理段階の計測値も追加
+        master_hits: 複数マスタ照合時の(マスタ表示名, マッチ件数)のリスト
+        """
+        import pandas as pd
+
+        summary_data = []
+        summary_data.append(["処理日時", datetime.now().strftime("%Y-%m-%d %H:%M:%S")])
+        summary_data.append(["総データ数", total_count])
+
+        if matched_count is not None:
+            summary_data.append(["マッチ成功", matched_count])
+            summary_data.append(["マッチ失敗", total_count - matched_count])
+
+        for i, (label, count) in enumerate(master_hits or (), 1):
+            summary_data.append([f"マスタ{i}マッチ: {label}", count])
+
+        summary_data.append(["ファイル名", os.path.basename(output_path)])
+        summary_data.append(["保存場所", os.path.dirname(os.path.abspath(output_path))])
+
+        if metrics is not None:
+            summary_data.extend(metrics.summary_rows())
+
+        return pd.DataFrame(summary_data, columns=["項目", "値"])
+
     def save_result_to_same_directory(
-        self, result_df, excel1_path, suffix="vlookup_result", include_summary=True
+        self,
+        result_df,
+        excel1_path,
+        suffix="vlookup_result",
+        include_summary=True,
+        writer_engine="openpyxl",
+        output_format="xlsx",
+        metrics=None,
+        master_hits=None,
+        matched_count=None,
+        duplicates=None,
     ):
         """
         結果を同ディレクトリの新規Excelファイルに保存
+
+        writer_engine: "openpyxl"（pandas.ExcelWriter）, "stream"（openpyxl write_only）,
+                       "xlsxwriter"（constant_memory）
+        output_format: "xlsx" 以外（csv / parquet / feather）はその形式で保存し、
+                       サマリーはサイドカーJSONに保存
         """
-        output_path = self.generate_output_path(excel1_path, suffix)
+        output_path = self.generate_output_path(
+            excel1_path, suffix, extension=OUTPUT_FORMATS[output_format]
+        )
 
         try:
+            extra_sheets = []
+            if include_summary:
+                # マッチング状況確認（集計済みの件数がなければ取得列から判定）
+                if matched_count is None and getattr(self, "return_cols", None):
+                    first_return_col = self.return_cols[0]
+                    if first_return_col in result_df.columns:
+                        matched_count = result_df[first_return_col].notna().sum()
+
+                summary_df = self.build_summary(
+                    output_path, len(result_df), matched_count, metrics, master_hits
+                )
+                extra_sheets.append(("処理サマリー", summary_df))
+
+                # 元データのサンプルも保存
+                if self.excel1_df is not None:
+                    extra_sheets.append(("元データサンプル", self.excel1_df.head(10)))
+
+            # マスタの重複キー
+            if duplicates is not None:
+                extra_sheets.append(("重複キー", duplicates))
+
+            self.write_result_file(
+                result_df, output_path, extra_sheets, writer_engine, output_format
+            )
+
+            self.log(f"   結果保存完了: {output_path}")
+            self.log(f"   ファイルサイズ: {os.path.getsize(output_path):,} bytes")
+
+            return output_path
+
+        except Exception as e:
+            self.log(f"   保存エラー: {e}", VERBOSITY_QUIET)
+            return None
+
+    def write_result_file(
+        self,
+        result_df,
+        output_path,
+        extra_sheets=(),
+        writer_engine="openpyxl",
+        output_format="xlsx",
+    ):
+        """結果シートと追加シート（サマリー等）をファイルに書き込み"""
+        import pandas as pd
+
+        if output_format == "xlsx" and writer_engine == "openpyxl":
             with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-                # メイン結果シート
                 result_df.to_excel(writer, sheet_name="VLOOKUP結果", index=False)
+                for sheet_name, df in extra_sheets:
+                    df.to_excel(writer, sheet_name=sheet_name, index=False)
+            return
+
+        # 逐次書き込み（セルをメモリに溜めない）
+        writer = open_result_writer(output_path, writer_engine, output_format)
+        writer.write_dataframe(result_df)
+        for sheet_name, df in extra_sheets:
+            writer.add_sheet(sheet_name, df)
+        summary_path = writer.close()
+        if summary_path:
+            self.log(f"   サマリー保存: {summary_path}")
+
+    def prepare_master(self, config):
+        """
+        マスタ（Excel2）を読み込みVLOOKUP用に整形したPreparedMasterを作成
+
+        configのexcel2_path, excel2_sheet, lookup_col, return_colsを使用
+        （master_cache, cache_dir, duplicate_policy, 期間照合のstart_col, end_colも有効）。
+        読み込みに失敗した場合・duplicate_policy="error"で重複キーがある場合は例外を送出
+        """
+        lookup_col = config["lookup_col"]
+        return_cols = config["return_cols"]
+        range_cols = range_columns(config)
+        duplicate_policy = parse_duplicate_policy(config.get("duplicate_policy"))
+        master_cols = list(
+            dict.fromkeys(
+                key_columns(lookup_col) + list(range_cols or ()) + list(return_cols)
+            )
+        )
+
+        self.log(f"   ファイル: {config['excel2_path']}")
+        self.log(f"   シート: {config['excel2_sheet']}")
+
+        # 整形済みマスタのキャッシュ確認（重複キーの検出結果も再利用）
+        cached = None
+        master_cache = config.get("master_cache", False)
+        if master_cache:
+            cache_path, cache_signature = self.master_cache_key(
+                config["excel2_path"],
+                config["excel2_sheet"],
+                master_cols,
+                cache_dir=config.get("cache_dir"),
+                use_hash=master_cache == "hash",
+                duplicate_policy=duplicate_policy,
+            )
+            cached = self.load_master_cache(cache_path, cache_signature)
+
+        if cached is not None:
+            self.log(f"   キャッシュから読み込み: {cache_path}")
+            df2_filtered, duplicates = cached
+        else:
+            df2 = self.read_excel_sheet(
+                config["excel2_path"], config["excel2_sheet"], usecols=master_cols
+            )
+            if df2 is None:
+                raise ValueError(f"マスタを読み込めません: {config['excel2_path']}")
+
+            if self.detail:
+                self.log(f"   サンプルデータ:", VERBOSITY_DETAIL)
+                self.log(df2.head().to_string(), VERBOSITY_DETAIL)
+
+            df2_filtered, duplicates = self.filter_master(
+                df2, lookup_col, return_cols, range_cols, duplicate_policy
+            )
+
+            if master_cache:
+                self.save_master_cache(
+                    cache_path, cache_signature, df2_filtered, duplicates
+                )
+
+        return PreparedMaster(
+            df2_filtered,
+            lookup_col,
+            return_cols,
+            source_path=config["excel2_path"],
+            sheet_name=config["excel2_sheet"],
+            range_cols=range_cols,
+            duplicates=duplicates,
+            duplicate_policy=duplicate_policy,
+        )
+
+    def prepare_masters(self, config):
+        """
+        照合順のPreparedMasterのリストを作成（configのmasters、未指定時はExcel2のみ）
+
+        すべてのマスタで取得列（return_cols）が同じである必要がある
+        """
+        configs = master_configs(config)
+        masters = []
+        for i, master_config in enumerate(configs, 1):
+            if len(configs) > 1:
+                self.log(f"   マスタ{i}:")
+            masters.append(self.prepare_master(master_config))
+        check_master_columns(masters)
+        return masters
+
+    def planned_sheet(self, sheets, path, key):
+        """run_jobsで読み込み済みのシートを取得（読み込みに失敗していれば例外）"""
+        df = sheets.get(key)
+        if df is None:
+            raise ValueError(f"シートを読み込めません: {path} - {key[1]}")
+        return df
+
+    def filter_master(
+        self, df2, lookup_col, return_cols, range_cols=None, duplicate_policy="first"
+    ):
+        """
+        マスタのDataFrameから検索キー列+取得列を取り出し、照合用に整形
+
+        キーの型合わせはExcel1と型が異なる場合のみ照合時に行う。
+        検索キーが空欄の行は照合対象にならないため除外し、重複キーはduplicate_policyで解消
+        （複合キーはいずれかのキー列が空欄の行を除外し、キー列の組み合わせで重複判定）
+        range_cols: 期間照合の(開始日列, 終了日列)。キー+開始日で重複判定する
+        戻り値は(整形済みマスタ, 重複キーのレポート（重複がなければNone）)
+        """
+        lookup_cols = key_columns(lookup_col)
+        master_cols = list(
+            dict.fromkeys(lookup_cols + list(range_cols or ()) + list(return_cols))
+        )
+        missing_cols = [col for col in master_cols if col not in df2.columns]
+        if missing_cols:
+            raise ValueError(
+                f"マスタに列{missing_cols}が存在しません。利用可能な列: {list(df2.columns)}"
+            )
+        df2_filtered = df2[master_cols]
+        df2_filtered = df2_filtered[df2_filtered[lookup_cols].notna().all(axis=1)]
+        if range_cols:
+            lookup_cols = lookup_cols + [range_cols[0]]
+        return resolve_duplicates(df2_filtered, lookup_cols, return_cols, duplicate_policy)
+
+    def lookup_dataframe(
+        self,
+        df1,
+        search_col,
+        master,
+        engine="merge",
+        match_mode="exact",
+        key_normalize=(),
+        date_col=None,
+    ):
+        """
+        DataFrameに準備済みマスタの取得列を付加
+
+        engine="merge": DataFrame.mergeで結合（結果は新しいDataFrame）
+        engine="index": マスタのpd.Indexで行位置を求め、取得列だけをdf1に追加
+                        （df1の既存列はコピーしない）
+        match_mode="approximate": ソート済みマスタを二分探索（engineは無視）
+        match_mode="date_range": date_colの日付を期間に含むマスタ行をキーごとに検索
+        key_normalize: 正規化手順のタプル。指定時は正規化済みマスタキーのIndexで
+                       行位置を求める（engineは無視）
+        """
+        import pandas as pd
+
+        lookup_col = master.lookup_col
+
+        # 複合キーは列ごとのキー番号の組み合わせで照合（engineは無視）
+        if match_mode != "exact" or key_normalize or master.is_composite:
+            positions = master.find_positions(
+                df1[search_col],
+                match_mode,
+                key_normalize,
+                dates=df1[date_col] if date_col else None,
+            )
+            return self.attach_master_columns(df1, search_col, master, positions)
+
+        if engine == "merge":
+            if not master.needs_string_keys(df1[search_col]):
+                return df1.merge(
+                    master.data, left_on=search_col, right_on=lookup_col, how="left"
+                )
+
+            # キーの型が異なる場合のみ文字列キーで結合（元のキー列はそのまま出力）
+            key_col = "__vlookup_key__"
+            right = master.data
+            if lookup_col == search_col:
+                right = right.drop(columns=[lookup_col])
+            right = right.assign(**{key_col: master.key_strings})
+            # 文字列化で同じキーになった行は先頭行のみ（indexエンジンと同じ）
+            right = right[
+                right[key_col].notna() & ~pd.Index(right[key_col]).duplicated()
+            ]
+            left = df1.assign(**{key_col: key_strings(df1[search_col])})
+            result = left.merge(right, on=key_col, how="left")
+            return result.drop(columns=[key_col])
+
+        if engine == "index":
+            positions = master.lookup_positions(df1[search_col])
+            return self.attach_master_columns(df1, search_col, master, positions)
+
+        raise ValueError(
+            f"不明なlookup_engineです: {engine}（{', '.join(LOOKUP_ENGINES)}）"
+        )
+
+    def cascade_values(
+        self, masters, keys, match_mode="exact", key_normalize=(), dates=None
+    ):
+        """
+        複数マスタを順に照合し、取得列の値を返す（IFERROR(VLOOKUP(マスタ1), VLOOKUP(マスタ2))相当）
+
+        前のマスタで見つからなかった行だけを次のマスタで照合する（キーが見つかれば
+        取得列が空欄でもその行は確定）。
+        戻り値は(取得列名→値の配列の辞書, マスタごとのマッチ件数のリスト,
+        行ごとにいずれかのマスタでキーが見つかったかの配列)
+        """
+        import numpy as np
+        import pandas as pd
+
+        if len(masters) == 1:
+            positions = masters[0].find_positions(keys, match_mode, key_normalize, dates)
+            found = positions >= 0
+            return masters[0].take(positions), [int(found.sum())], found
+
+        index = pd.RangeIndex(len(keys))
+        remaining = np.arange(len(keys))
+        parts = {col: [] for col in masters[0].return_cols}
+        master_hits = []
+        for i, master in enumerate(masters):
+            if len(remaining) == 0:
+                master_hits.append(0)
+                continue
+            positions = master.find_positions(keys, match_mode, key_normalize, dates)
+            found = positions >= 0
+            master_hits.append(int(found.sum()))
+            for col, col_values in master.take(positions[found]).items():
+                parts[col].append(pd.Series(col_values, index=remaining[found]))
+            remaining = remaining[~found]
+
+            # 未確定の行のキー（と日付）だけを次のマスタで照合
+            if i + 1 < len(masters):
+                keys = keys.iloc[~found].reset_index(drop=True)
+                if dates is not None:
+                    dates = dates.iloc[~found].reset_index(drop=True)
+
+        values = {
+            col: (pd.concat(col_parts) if col_parts else pd.Series(dtype=object))
+            .reindex(index)
+            .array
+            for col, col_parts in parts.items()
+        }
+        matched = np.ones(len(index), dtype=bool)
+        matched[remaining] = False
+        return values, master_hits, matched
+
+    def cascade_lookup(
+        self,
+        df1,
+        search_col,
+        masters,
+        match_mode="exact",
+        key_normalize=(),
+        date_col=None,
+    ):
+        """
+        DataFrameに複数マスタを順に照合した取得列を付加
+
+        戻り値は(結果DataFrame, マスタごとのマッチ件数のリスト, 行ごとのマッチ有無)
+        """
+        values, master_hits, matched = self.cascade_values(
+            masters,
+            df1[search_col],
+            match_mode,
+            key_normalize,
+            dates=df1[date_col] if date_col else None,
+        )
+        result = df1.copy(deep=False)
+        for col, col_values in values.items():
+            result[col] = col_values
+        return result, master_hits, matched
+
+    def attach_master_columns(self, df1, search_col, master, positions):
+        """マスタの行位置から取得列を取り出してdf1に追加（-1の行は欠損値）"""
+        search_cols = key_columns(search_col)
+        # mergeと同じくExcel1側と列名が異なるマスタ側の検索キー列も出力
+        columns = [
+            col for col in master.lookup_cols if col not in search_cols
+        ] + master.return_cols
+        # 浅いコピーに列を追加（既存列のデータはコピーせず、元のdf1も変更しない）
+        result = df1.copy(deep=False)
+        for col, values in master.take(positions, columns).items():
+            result[col] = values
+        return result
+
+    def inject_lookup_columns(self, config, master=None, metrics=None):
+        """
+        Excel1の元ブックに取得列を追加して別ファイルに保存
+
+        対象シートの検索キー列だけをセルから読み取り、取得列を右端の空き列に書き込む。
+        他のシートや書式・数式はDataFrameを経由せずそのまま保存する
+        metrics: 処理段階ごとの計測値と件数を記録するVlookupResult（省略可）
+        """
+        import pandas as pd
+        from openpyxl import load_workbook
+        from openpyxl.styles import Font
+
+        excel1_path = config["excel1_path"]
+        search_col = config["search_col"]
+        match_mode = config.get("match_mode", "exact")
+        key_normalize = parse_key_normalize(config.get("key_normalize"))
+        date_col = config.get("date_col") if match_mode == "date_range" else None
+        if metrics is None:
+            metrics = VlookupResult()
+
+        metrics.begin_stage("1. Excel2読み込み")
+        self.log(f"\n1. Excel2読み込み")
+        if master is None:
+            masters = self.prepare_masters(config)
+        else:
+            masters = list(master) if isinstance(master, (list, tuple)) else [master]
+            check_master_columns(masters)
+            for prepared in masters:
+                self.log(f"   準備済みマスタを使用: {master_label(prepared)}")
+        for prepared in masters:
+            if prepared.duplicates is not None:
+                self.log(
+                    f"   重複キー: {len(prepared.duplicates)}件"
+                    f"（{prepared.duplicate_policy}、{master_label(prepared)}）"
+                )
+        self.return_cols = masters[0].return_cols
+
+        metrics.begin_stage("2. Excel1ブック読み込み")
+        self.log(f"\n2. Excel1ブックを開く")
+        self.log(f"   ファイル: {excel1_path}")
+        if not os.path.exists(excel1_path):
+            raise FileNotFoundError(f"ファイルが見つかりません: {excel1_path}")
+        wb = load_workbook(excel1_path, keep_vba=excel1_path.lower().endswith(".xlsm"))
+
+        sheet_name = config["excel1_sheet"]
+        if sheet_name not in wb.sheetnames:
+            self.log(f"警告: シート'{sheet_name}'が見つかりません", VERBOSITY_QUIET)
+            self.log(f"利用可能なシート: {wb.sheetnames}")
+            sheet_name = wb.sheetnames[0]
+            self.log(f"代わりに'{sheet_name}'シートを使用します")
+        ws = wb[sheet_name]
+        self.log(f"   シート: {sheet_name}")
+
+        # 検索キー列（期間照合は日付列も）のセルだけを読み取る。数式のセルは計算済みの値で
+        # 照合するため、書き込み用のブックとは別にdata_onlyのハンドルで読む
+        values_wb = load_workbook(excel1_path, read_only=True, data_only=True)
+        try:
+            values_ws = values_wb[sheet_name]
+            header = list(next(values_ws.iter_rows(max_row=1, values_only=True), ()))
+            search_cols = key_columns(search_col)
+            if date_col:
+                search_cols = list(dict.fromkeys(search_cols + [date_col]))
+            missing_cols = [col for col in search_cols if col not in header]
+            if missing_cols:
+                raise ValueError(
+                    f"Excel1に列{missing_cols}が存在しません。利用可能な列: {header}"
+                )
+            key_col_indexes = [header.index(col) + 1 for col in search_cols]
+            min_col = min(key_col_indexes)
+            rows = list(
+                values_ws.iter_rows(
+                    min_row=2,
+                    max_row=ws.max_row,
+                    min_col=min_col,
+                    max_col=max(key_col_indexes),
+                    values_only=True,
+                )
+            )
+        finally:
+            values_wb.close()
+        # 書き込み先の行番号と揃える（末尾の空行は読み取られないことがある）
+        rows += [()] * (ws.max_row - 1 - len(rows))
+
+        def cell_value(row, offset):
+            return row[offset] if offset < len(row) else None
+
+        key_values = {
+            col: pd.Series([cell_value(row, index - min_col) for row in rows], dtype=object)
+            for col, index in zip(search_cols, key_col_indexes)
+        }
+        if isinstance(search_col, (list, tuple)):
+            keys = pd.DataFrame({col: key_values[col] for col in search_col})
+        else:
+            keys = key_values[search_col]
+
+        metrics.begin_stage("3. 取得列の書き込み")
+        self.log(f"\n3. 取得列の書き込み")
+        values, master_hits, matched = self.cascade_values(
+            masters,
+            keys,
+            match_mode,
+            key_normalize,
+            dates=key_values[date_col] if date_col else None,
+        )
+        start_col = ws.max_column + 1
+        for offset, (col, col_values) in enumerate(values.items()):
+            col_index = start_col + offset
+            header_cell = ws.cell(row=1, column=col_index, value=col)
+            header_cell.font = Font(bold=True)
+
+            col_values = pd.Series(col_values, dtype=object)
+            col_values = col_values.where(col_values.notna(), None)
+            for row_index, value in enumerate(col_values, 2):
+                if value is not None:
+                    ws.cell(row=row_index, column=col_index, value=value)
+            self.log(f"   {col} → 列{col_index}")
+
+        total_count = len(keys)
+        matched_count = int(matched.sum())
+        metrics.total_count = total_count
+        metrics.matched_count = matched_count
+        self.log(f"   総データ数: {total_count}行")
+        self.log(f"   マッチ成功: {matched_count}行")
+        self.log(f"   マッチ失敗: {total_count - matched_count}行")
+        if len(masters) > 1:
+            metrics.master_hits = []
+            for i, (prepared, count) in enumerate(zip(masters, master_hits), 1):
+                self.log(f"     マスタ{i}: {count}行（{master_label(prepared)}）")
+                metrics.master_hits.append(
+                    {"master": master_label(prepared), "matched_count": count}
+                )
+
+        metrics.begin_stage("4. 保存")
+        self.log(f"\n4. 保存中...")
+        auto_save = config.get("auto_save_same_dir", True)
+        output_path = config.get("output_path")
+        if auto_save or not output_path:
+            output_path = self.generate_output_path(
+                excel1_path,
+                suffix="vlookup_injected",
+                extension=os.path.splitext(excel1_path)[1],
+            )
+        wb.save(output_path)
+        wb.close()
+        metrics.end_stage()
+        metrics.output_path = output_path
+        self.log(f"   保存完了: {output_path}")
+        self.log(f"   ファイルサイズ: {os.path.getsize(output_path):,} bytes")
+
+        return output_path
+
+    def complete_run(self, metrics, config, success, error=None):
+        """
+        計測を終了し、処理段階ごとの計測値を表示・保存してVlookupResultを返す
+
+        config['metrics_file']がTrueの場合は出力ファイル名_metrics.json、
+        文字列の場合はそのパスにJSONで保存
+        """
+        metrics.finish(success, error)
+
+        if metrics.stages:
+            self.log(f"\n処理時間（段階別）:")
+            for stage in metrics.stages:
+                self.log(
+                    f"   {stage['stage']}: {stage['wall_sec']:.3f}秒"
+                    f"（CPU {stage['cpu_sec']:.3f}秒）"
+                )
+
+        metrics_file = config.get("metrics_file")
+        if metrics_file:
+            if metrics_file is True:
+                if metrics.output_path:
+                    base = os.path.splitext(metrics.output_path)[0]
+                    metrics_file = f"{base}_metrics.json"
+                else:
+                    metrics_file = self.generate_output_path(
+                        config["excel1_path"], suffix="vlookup_metrics", extension=".json"
+                    )
+            try:
+                metrics.write_json(metrics_file)
+                self.log(f"計測結果保存: {metrics_file}")
+            except Exception as e:
+                self.log(f"計測結果の保存エラー: {e}", VERBOSITY_QUIET)
+
+        return metrics
+
+    def plan_job_reads(self, jobs):
+        """
+        複数ジョブで読み込むシートと列を集約
+
+        (ファイルパス, シート名)ごとに全ジョブで必要な列の和集合を求める
+        （いずれかのジョブが全列を必要とする場合はNone）。
+        inject・チャンクモードのジョブのExcel1は各ジョブで読み込むため対象外
+        """
+        plan = {}
+
+        def add(path, sheet_name, columns):
+            key = (os.path.abspath(path), sheet_name)
+            if key in plan and plan[key] is None:
+                return
+            if columns is None:
+                plan[key] = None
+            else:
+                plan[key] = list(dict.fromkeys(plan.get(key, []) + list(columns)))
+
+        for job in jobs:
+            for master_job in master_configs(job):
+                add(
+                    master_job["excel2_path"],
+                    master_job["excel2_sheet"],
+                    key_columns(master_job["lookup_col"])
+                    + list(range_columns(master_job) or ())
+                    + list(master_job["return_cols"]),
+                )
+            if job.get("output_mode", "new") == "inject" or job.get("chunk_size"):
+                continue
+            excel1_cols = job.get("excel1_cols")
+            date_cols = [job["date_col"]] if job.get("date_col") else []
+            add(
+                job["excel1_path"],
+                job["excel1_sheet"],
+                key_columns(job["search_col"]) + date_cols + list(excel1_cols)
+                if excel1_cols
+                else None,
+            )
+        return plan
+
+    def run_jobs(self, jobs):
+        """
+        複数のVLOOKUPジョブを実行（各シートは一度だけ読み込む）
 
-                if include_summary:
-                    # サマリー情報作成
-                    summary_data = []
-                    summary_data.append(
-                        ["処理日時", datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
+        jobs: vlookup_with_sheetsの設定と同じ形式の辞書のリスト（'name'でジョブ名を指定可）
+        同じシートを使うジョブ間で読み込み結果と整形済みマスタを共有する。
+        戻り値はジョブごとのVlookupResultのリスト
+        """
+        plan = self.plan_job_reads(jobs)
+        self.log("=== 複数ジョブ実行 ===")
+        self.log(f"ジョブ数: {len(jobs)} / 読み込むシート数: {len(plan)}")
+
+        # 各シートを一度だけ読み込み（同じファイルのハンドルも共有）
+        sheets = {}
+        with self.reusing_workbooks():
+            for (path, sheet_name), columns in plan.items():
+                self.log(f"\n読み込み: {path} - {sheet_name}")
+                # 列の不足は各ジョブで確認（1つのジョブの誤りで他のジョブを止めない）
+                sheets[(path, sheet_name)] = self.read_excel_sheet(
+                    path, sheet_name, usecols=columns, missing_ok=True
+                )
+
+        masters = {}
+        results = []
+        for i, job in enumerate(jobs, 1):
+            name = job.get("name", f"ジョブ{i}")
+            self.log(f"\n--- {name} ({i}/{len(jobs)}) ---")
+
+            try:
+                job_masters = []
+                for master_job in master_configs(job):
+                    range_cols = range_columns(master_job)
+                    duplicate_policy = parse_duplicate_policy(
+                        master_job.get("duplicate_policy")
+                    )
+                    master_key = (
+                        os.path.abspath(master_job["excel2_path"]),
+                        master_job["excel2_sheet"],
+                        tuple(key_columns(master_job["lookup_col"])),
+                        tuple(master_job["return_cols"]),
+                        range_cols,
+                        duplicate_policy,
                     )
-                    summary_data.append(["総データ数", len(result_df)])
-
-                    # マッチング状況確認
-                    if hasattr(self, "return_cols") and self.return_cols:
-                        first_return_col = self.return_cols[0]
-                        if first_return_col in result_df.columns:
-                            matched_count = result_df[first_return_col].notna().sum()
-                            unmatched_count = len(result_df) - matched_count
-                            summary_data.append(["マッチ成功", matched_count])
-                            summary_data.append(["マッチ失敗", unmatched_count])
-
-                    summary_data.append(["ファイル名", os.path.basename(output_path)])
-                    summary_data.append(["保存場所", os.path.dirname(output_path)])
-
-                    summary_df = pd.DataFrame(summary_data, columns=["項目", "値"])
-                    summary_df.to_excel(writer, sheet_name="処理サマリー", index=False)
-
-                    # 元データのサンプルも保存
-                    if self.excel1_df is not None:
-                        sample_df = self.excel1_df.head(10)
-                        sample_df.to_excel(
-                            writer, sheet_name="元データサンプル", index=False
+                    master = masters.get(master_key)
+                    if master is None:
+                        # 重複キーの検出・解消は同じマスタを使うジョブ間で一度だけ
+                        data, duplicates = self.filter_master(
+                            self.planned_sheet(
+                                sheets, master_job["excel2_path"], master_key[:2]
+                            ),
+                            master_job["lookup_col"],
+                            master_job["return_cols"],
+                            range_cols,
+                            duplicate_policy,
                         )
+                        master = PreparedMaster(
+                            data,
+                            master_job["lookup_col"],
+                            master_job["return_cols"],
+                            source_path=master_job["excel2_path"],
+                            sheet_name=master_job["excel2_sheet"],
+                            range_cols=range_cols,
+                            duplicates=duplicates,
+                            duplicate_policy=duplicate_policy,
+                        )
+                        masters[master_key] = master
+                    job_masters.append(master)
+
+                excel1_df = None
+                excel1_key = (os.path.abspath(job["excel1_path"]), job["excel1_sheet"])
+                if excel1_key in plan and job.get("output_mode", "new") != "inject":
+                    excel1_df = self.planned_sheet(sheets, job["excel1_path"], excel1_key)
+            except Exception as e:
+                self.log(f"エラー: {e}", VERBOSITY_QUIET)
+                results.append(VlookupResult().finish(False, str(e)))
+                continue
+
+            results.append(
+                self.vlookup_with_sheets(job, master=job_masters, excel1_df=excel1_df)
+            )
 
-            print(f"   結果保存完了: {output_path}")
-            print(f"   ファイルサイズ: {os.path.getsize(output_path):,} bytes")
-
-            return output_path
+        success_count = sum(1 for result in results if result)
+        self.log(f"\n=== 複数ジョブ実行完了 ===")
+        self.log(f"成功: {success_count}件 / 失敗: {len(results) - success_count}件")
+        for job, result in zip(jobs, results):
+            if not result:
+                self.log(
+                    f"  失敗: {job.get('name', job['excel1_path'])}（{result.error}）",
+                    VERBOSITY_QUIET,
+                )
 
-        except Exception as e:
-            print(f"   保存エラー: {e}")
-            return None
+        return results
 
-    def vlookup_with_sheets(self, config):
+    def vlookup_with_sheets(self, config, master=None, excel1_df=None):
         """
         シート指定でVLOOKUP実行
 
+        master: prepare_masterで作成したPreparedMaster、または照合順のリスト
+                （省略時はconfigから読み込み）。
+                指定時はexcel2_path, excel2_sheet, lookup_col, return_colsは不要
+        excel1_df: 読み込み済みのExcel1シート（省略時はconfigのファイルから読み込み）
+
         config = {
             'excel1_path': 'ファイル1のパス',
             'excel1_sheet': 'シート名1',
             'excel2_path': 'ファイル2のパス',
             'excel2_sheet': 'シート名2',
-            'search_col': '検索キー列名',
-            'lookup_col': 'マスタ検索キー列名',
+            'search_col': '検索キー列名',  # 複合キーは列名のリスト（例: ['顧客コード', '商品コード']）
+            'lookup_col': 'マスタ検索キー列名',  # 複合キーの場合はsearch_colと同じ順の列名リスト
             'return_cols': ['取得列1', '取得列2'],
+            'masters': [  # 複数マスタを順に照合（未マッチの行だけ次のマスタへ）。省略可
+                {'excel2_path': 'マスタA', 'excel2_sheet': 'シートA'},
+                {'excel2_path': 'マスタB', 'excel2_sheet': 'シートB', 'lookup_col': 'キー列'},
+            ],
+            'excel1_cols': ['出力に残すExcel1の列'],  # 省略時は全列
+            'chunk_size': 50000,  # 指定時はExcel1をチャンク単位で読み込み・結果を逐次出力
+            'lookup_engine': 'merge',  # 'index': マスタのIndexで行位置を求めて列を追加
+            'match_mode': 'exact',  # 'approximate': VLOOKUPのTRUE（検索キー以下の最大値）
+                                    # 'date_range': 日付が適用期間に含まれるマスタ行
+            'date_col': 'Excel1の日付列（date_rangeのみ）',
+            'start_col': 'マスタの開始日列（date_rangeのみ）',
+            'end_col': 'マスタの終了日列（date_rangeのみ、空欄は終了日なし）',
+            'key_normalize': ['nfkc', 'strip', 'casefold'],  # 照合時のキー正規化（省略時なし）
+            'duplicate_policy': 'first',  # 'last' / 'error' / 'aggregate:sum'（max, concat）
+            'master_cache': True,  # 整形済みマスタをキャッシュ（'hash'で内容ハッシュ検証）
+            'cache_dir': 'キャッシュ保存先（省略時はユーザーごとのキャッシュディレクトリ）',
             'output_path': '出力ファイルパス（省略可）',
-            'auto_save_same_dir': True  # 同ディレクトリ自動保存
+            'auto_save_same_dir': True,  # 同ディレクトリ自動保存
+            'writer_engine': 'openpyxl',  # 'stream' / 'xlsxwriter': 逐次書き込みで省メモリ
+            'output_format': 'xlsx',  # 'csv' / 'parquet' / 'feather'（サマリーはJSON）
+            'output_mode': 'new',  # 'inject': 元ブックの対象シートに取得列を追加して保存
+            'verbosity': 'detail',  # 'normal': プレビューなし, 'quiet': エラーのみ表示
+            'metrics_summary': False,  # True: 処理サマリーに段階別の処理時間・メモリを追加
+            'metrics_file': None,  # 計測結果のJSONパス（True: 出力ファイル名_metrics.json）
+            'trace_memory': False  # True: tracemallocで段階内のピークメモリも計測（低速）
         }
-        """
 
-        print("=== Excel VLOOKUP (シート指定) 処理開始 ===")
-        print(f"開始時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        戻り値はVlookupResult（成否・件数・処理段階ごとの実時間/CPU時間/最大メモリ）。
+        真偽値として評価すると成否を返す
+        """
+        # Excel1とマスタが同じファイルの場合もハンドルを共有し、終了時に閉じる
+        with self.reusing_workbooks():
+            return self._vlookup_with_sheets(config, master, excel1_df)
+
+    def _vlookup_with_sheets(self, config, master, excel1_df):
+        """vlookup_with_sheetsの本体"""
+        # 表示レベルはこの実行の間だけ設定値に切り替える
+        default_verbosity = self.verbosity
+        metrics = VlookupResult(trace_memory=config.get("trace_memory", False))
+        summary_metrics = metrics if config.get("metrics_summary") else None
+        writer = None
 
         try:
-            # Excel1読み込み
-            print(f"\n1. Excel1読み込み")
-            print(f"   ファイル: {config['excel1_path']}")
-            print(f"   シート: {config['excel1_sheet']}")
-
-            df1 = self.read_excel_sheet(config["excel1_path"], config["excel1_sheet"])
-            if df1 is None:
-                return False
+            if config.get("verbosity") is not None:
+                self.verbosity = parse_verbosity(config["verbosity"])
 
-            self.excel1_df = df1
-            print(f"   サンプルデータ:")
-            print(df1.head().to_string())
-
-            # Excel2読み込み
-            print(f"\n2. Excel2読み込み")
-            print(f"   ファイル: {config['excel2_path']}")
-            print(f"   シート: {config['excel2_sheet']}")
-
-            df2 = self.read_excel_sheet(config["excel2_path"], config["excel2_sheet"])
-            if df2 is None:
-                return False
+            self.log("=== Excel VLOOKUP (シート指定) 処理開始 ===")
+            self.log(f"開始時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
-            self.excel2_df = df2
-            print(f"   サンプルデータ:")
-            print(df2.head().to_string())
+            output_mode = config.get("output_mode", "new")
+            if output_mode == "inject":
+                output_path = self.inject_lookup_columns(
+                    config, master=master, metrics=metrics
+                )
+                self.log(f"\n=== 処理完了 ===")
+                self.log(f"完了時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                self.log(f"出力ファイル: {output_path}")
+                return self.complete_run(metrics, config, True)
+            if output_mode != "new":
+                raise ValueError(
+                    f"不明なoutput_modeです: {output_mode}（{', '.join(OUTPUT_MODES)}）"
+                )
 
-            # VLOOKUP設定
+            # VLOOKUP設定（準備済みマスタがあればその設定を使用）
             search_col = config["search_col"]
-            lookup_col = config["lookup_col"]
-            return_cols = config["return_cols"]
+            masters = None
+            if master is not None:
+                masters = list(master) if isinstance(master, (list, tuple)) else [master]
+                check_master_columns(masters)
+                return_cols = masters[0].return_cols
+            else:
+                return_cols = config["return_cols"]
             self.return_cols = return_cols  # サマリー用に保存
 
-            if search_col not in df1.columns:
-                raise ValueError(
-                    f"Excel1に列'{search_col}'が存在しません。利用可能な列: {list(df1.columns)}"
+            # 読み込む列を設定から決定（不要な列は解析しない）
+            excel1_cols = config.get("excel1_cols")
+            excel1_usecols = None
+            if excel1_cols:
+                date_cols = [config["date_col"]] if config.get("date_col") else []
+                excel1_usecols = list(
+                    dict.fromkeys(key_columns(search_col) + date_cols + list(excel1_cols))
                 )
-            if lookup_col not in df2.columns:
+            chunk_size = config.get("chunk_size")
+            lookup_engine = config.get("lookup_engine", "merge")
+            match_mode = config.get("match_mode", "exact")
+            key_normalize = parse_key_normalize(config.get("key_normalize"))
+            date_col = None
+            if match_mode == "date_range":
+                date_col = config.get("date_col")
+                if not date_col:
+                    raise ValueError("期間照合（date_range）にはdate_colを指定してください")
+            writer_engine = config.get("writer_engine", "openpyxl")
+            output_format = config.get("output_format", "xlsx")
+            if output_format not in OUTPUT_FORMATS:
                 raise ValueError(
-                    f"Excel2に列'{lookup_col}'が存在しません。利用可能な列: {list(df2.columns)}"
+                    f"不明なoutput_formatです: {output_format}（{', '.join(OUTPUT_FORMATS)}）"
                 )
 
-            for col in return_cols:
-                if col not in df2.columns:
-                    raise ValueError(
-                        f"Excel2に列'{col}'が存在しません。利用可能な列: {list(df2.columns)}"
+            # Excel1読み込み
+            metrics.begin_stage("1. Excel1読み込み")
+            self.log(f"\n1. Excel1読み込み")
+            self.log(f"   ファイル: {config['excel1_path']}")
+            self.log(f"   シート: {config['excel1_sheet']}")
+
+            if excel1_df is not None:
+                # 読み込み済みのシートから必要な列だけを使用
+                self.log(f"   読み込み済みのシートを使用")
+                df1 = excel1_df
+                if excel1_usecols is not None:
+                    missing_cols = [
+                        col for col in excel1_usecols if col not in df1.columns
+                    ]
+                    if missing_cols:
+                        raise ValueError(
+                            f"列{missing_cols}が存在しません。利用可能な列: {list(df1.columns)}"
+                        )
+                    df1 = df1[excel1_usecols]
+                df1_chunks = iter(())
+            elif chunk_size:
+                # ストリーミング読み込み（先頭チャンクで列確認・サンプル表示）
+                df1_chunks = self.iter_excel_sheet(
+                    config["excel1_path"],
+                    config["excel1_sheet"],
+                    chunk_size=chunk_size,
+                    usecols=excel1_usecols,
+                )
+                df1 = next(df1_chunks)
+            else:
+                df1 = self.read_excel_sheet(
+                    config["excel1_path"], config["excel1_sheet"], usecols=excel1_usecols
+                )
+                if df1 is None:
+                    return self.complete_run(
+                        metrics, config, False, "Excel1を読み込めません"
                     )
+                df1_chunks = iter(())
 
-            print(f"\n3. VLOOKUP設定確認")
-            print(f"   検索キー(Excel1): {search_col}")
-            print(f"   検索キー(Excel2): {lookup_col}")
-            print(f"   取得列: {return_cols}")
-
-            # データ準備
-            df1[search_col] = df1[search_col].astype(str)
-            df2[lookup_col] = df2[lookup_col].astype(str)
+            self.excel1_df = df1
+            if self.detail:
+                self.log(f"   サンプルデータ:", VERBOSITY_DETAIL)
+                self.log(df1.head().to_string(), VERBOSITY_DETAIL)
 
-            # マスタデータから必要列のみ抽出
-            master_cols = [lookup_col] + return_cols
-            df2_filtered = df2[master_cols].copy()
-            df2_filtered = df2_filtered.drop_duplicates(subset=[lookup_col])
+            # Excel2読み込み
+            metrics.begin_stage("2. Excel2読み込み")
+            if masters is not None:
+                self.log(f"\n2. Excel2（準備済みマスタを使用）")
+                for prepared in masters:
+                    self.log(f"   ファイル: {prepared.source_path}")
+                    self.log(f"   シート: {prepared.sheet_name}")
+            else:
+                self.log(f"\n2. Excel2読み込み")
+                masters = self.prepare_masters(config)
+
+            master = masters[0]
+            lookup_col = master.lookup_col
+            df2_filtered = master.data
+            self.excel2_df = df2_filtered
+
+            missing_cols = [
+                col for col in key_columns(search_col) if col not in df1.columns
+            ]
+            if missing_cols:
+                raise ValueError(
+                    f"Excel1に列{missing_cols}が存在しません。利用可能な列: {list(df1.columns)}"
+                )
+            for prepared in masters:
+                if len(key_columns(search_col)) != len(prepared.lookup_cols):
+                    raise ValueError(
+                        f"search_colとlookup_colの列数が一致しません: "
+                        f"{search_col} / {prepared.lookup_col}"
+                    )
 
-            print(f"   マスタデータ（重複削除後）: {len(df2_filtered)}行")
+            metrics.begin_stage("3. VLOOKUP設定確認")
+            self.log(f"\n3. VLOOKUP設定確認")
+            self.log(f"   検索キー(Excel1): {search_col}")
+            self.log(f"   検索キー(Excel2): {lookup_col}")
+            self.log(f"   取得列: {return_cols}")
+            self.log(f"   照合方法: {match_mode}")
+            if date_col:
+                start_col, end_col = master.range_cols or (None, None)
+                self.log(f"   期間照合: {date_col} が [{start_col}, {end_col}] に含まれる行")
+            if key_normalize:
+                self.log(f"   キー正規化: {', '.join(key_normalize)}")
+            elif master.is_composite:
+                self.log(f"   複合キー: 列ごとのキー番号の組み合わせで照合")
+            elif match_mode == "exact" and len(masters) == 1:
+                self.log(f"   結合エンジン: {lookup_engine}")
+            if len(masters) > 1:
+                # 未マッチの行だけを次のマスタで照合（IFERRORのVLOOKUP連鎖と同じ）
+                self.log(f"   照合順（未マッチの行のみ次のマスタへ）:")
+                for i, prepared in enumerate(masters, 1):
+                    self.log(
+                        f"     マスタ{i}: {master_label(prepared)}"
+                        f"（キー: {prepared.lookup_col}, 重複削除後 {len(prepared)}行）"
+                    )
+            else:
+                self.log(f"   マスタデータ（重複削除後）: {len(df2_filtered)}行")
+            for prepared in masters:
+                if prepared.duplicates is not None:
+                    self.log(
+                        f"   重複キー: {len(prepared.duplicates)}件"
+                        f"（{prepared.duplicate_policy}、{master_label(prepared)}）"
+                    )
+            duplicates = duplicate_sheet(masters)
 
-            # VLOOKUP実行
-            print(f"\n4. VLOOKUP実行中...")
-            result = df1.merge(
-                df2_filtered, left_on=search_col, right_on=lookup_col, how="left"
-            )
+            # 結果保存先
+            auto_save = config.get("auto_save_same_dir", True)
+            output_path = config.get("output_path")
 
-            self.result_df = result
+            if chunk_size:
+                # チャンクモードでは結果を出力ファイルへ逐次追記（全体を保持しない）
+                if auto_save or not output_path:
+                    final_output_path = self.generate_output_path(
+                        config["excel1_path"],
+                        suffix="vlookup_result",
+                        extension=OUTPUT_FORMATS[output_format],
+                    )
+                else:
+                    final_output_path = output_path
+                # 検索キー列はチャンクごとに数値・文字列が変わりうるため文字列で保存
+                writer = open_result_writer(
+                    final_output_path,
+                    writer_engine,
+                    output_format,
+                    text_cols=key_columns(search_col),
+                )
 
-            # 結果確認
-            matched_count = result[return_cols[0]].notna().sum()
-            unmatched_count = len(result) - matched_count
+            # VLOOKUP実行（チャンクモードではExcel1の読み込み・結果の書き込みも含む）
+            metrics.begin_stage("4. VLOOKUP実行")
+            self.log(f"\n4. VLOOKUP実行中...")
+            result = None
+            result_preview = None
+            total_count = 0
+            matched_count = 0
+            unmatched_keys = []
+            master_hits = [0] * len(masters)
+
+            for i, chunk in enumerate(chain([df1], df1_chunks), 1):
+                if len(masters) > 1:
+                    chunk_result, chunk_hits, matched = self.cascade_lookup(
+                        chunk,
+                        search_col,
+                        masters,
+                        match_mode=match_mode,
+                        key_normalize=key_normalize,
+                        date_col=date_col,
+                    )
+                    master_hits = [a + b for a, b in zip(master_hits, chunk_hits)]
+                else:
+                    chunk_result = self.lookup_dataframe(
+                        chunk,
+                        search_col,
+                        master,
+                        engine=lookup_engine,
+                        match_mode=match_mode,
+                        key_normalize=key_normalize,
+                        date_col=date_col,
+                    )
+                    matched = chunk_result[return_cols[0]].notna()
+
+                # マッチ件数を逐次集計（複数マスタはいずれかのマスタでキーが見つかった行）
+                total_count += len(chunk_result)
+                matched_count += int(matched.sum())
+                if self.detail and len(unmatched_keys) < 5:
+                    unmatched = chunk_result.loc[~matched, search_col]
+                    if isinstance(search_col, (list, tuple)):
+                        # 複合キーは列の組み合わせ（タプル）で表示
+                        unmatched = unmatched.drop_duplicates().itertuples(
+                            index=False, name=None
+                        )
+                    else:
+                        unmatched = unmatched.unique()
+                    for key in unmatched:
+                        if len(unmatched_keys) >= 5:
+                            break
+                        if key not in unmatched_keys:
+                            unmatched_keys.append(key)
+
+                if self.detail and result_preview is None:
+                    result_preview = chunk_result.head()
+
+                if writer is None:
+                    result = chunk_result
+                else:
+                    writer.write_dataframe(chunk_result)
+                    self.log(f"   チャンク{i}: 累計{total_count}行を出力")
 
-            print(f"   処理完了!")
-            print(f"   総データ数: {len(result)}行")
-            print(f"   マッチ成功: {matched_count}行")
-            print(f"   マッチ失敗: {unmatched_count}行")
+            self.result_df = result
+            unmatched_count = total_count - matched_count
+            metrics.total_count = total_count
+            metrics.matched_count = matched_count
+
+            self.log(f"   処理完了!")
+            self.log(f"   総データ数: {total_count}行")
+            self.log(f"   マッチ成功: {matched_count}行")
+            self.log(f"   マッチ失敗: {unmatched_count}行")
+
+            # マスタごとのマッチ件数（処理サマリーに記録）
+            summary_hits = None
+            if len(masters) > 1:
+                summary_hits = [
+                    (master_label(prepared), count)
+                    for prepared, count in zip(masters, master_hits)
+                ]
+                metrics.master_hits = [
+                    {"master": label, "matched_count": count}
+                    for label, count in summary_hits
+                ]
+                for i, (label, count) in enumerate(summary_hits, 1):
+                    self.log(f"     マスタ{i}: {count}行（{label}）")
 
-            if unmatched_count > 0:
-                print(f"\n   マッチしなかった検索キー（上位5件）:")
-                unmatched_keys = result[result[return_cols[0]].isna()][
-                    search_col
-                ].unique()[:5]
-                for key in unmatched_keys:
-                    print(f"     - {key}")
+            metrics.begin_stage("5. 結果サンプル")
+            if self.detail:
+                if unmatched_count > 0:
+                    self.log(f"\n   マッチしなかった検索キー（上位5件）:", VERBOSITY_DETAIL)
+                    for key in unmatched_keys:
+                        self.log(f"     - {key}", VERBOSITY_DETAIL)
 
-            # 結果サンプル表示
-            print(f"\n5. 結果サンプル:")
-            print(result.head().to_string())
+                # 結果サンプル表示
+                self.log(f"\n5. 結果サンプル:", VERBOSITY_DETAIL)
+                self.log(result_preview.to_string(), VERBOSITY_DETAIL)
 
             # 結果保存
-            auto_save = config.get("auto_save_same_dir", True)
-            output_path = config.get("output_path")
-
-            if auto_save or not output_path:
-                print(f"\n6. 同ディレクトリに結果保存中...")
+            metrics.begin_stage("6. 結果保存")
+            if writer is not None:
+                self.log(f"\n6. 結果保存中...")
+                if auto_save or not output_path:
+                    writer.add_sheet(
+                        "処理サマリー",
+                        self.build_summary(
+                            final_output_path,
+                            total_count,
+                            matched_count,
+                            summary_metrics,
+                            summary_hits,
+                        ),
+                    )
+                    writer.add_sheet("元データサンプル", self.excel1_df.head(10))
+                if duplicates is not None:
+                    writer.add_sheet("重複キー", duplicates)
+                summary_path = writer.close()
+                writer = None
+                if summary_path:
+                    self.log(f"   サマリー保存: {summary_path}")
+                self.log(f"   結果保存完了: {final_output_path}")
+                self.log(f"   ファイルサイズ: {os.path.getsize(final_output_path):,} bytes")
+            elif auto_save or not output_path:
+                self.log(f"\n6. 同ディレクトリに結果保存中...")
                 saved_path = self.save_result_to_same_directory(
-                    result, config["excel1_path"], suffix="vlookup_result"
+                    result,
+                    config["excel1_path"],
+                    suffix="vlookup_result",
+                    writer_engine=writer_engine,
+                    output_format=output_format,
+                    metrics=summary_metrics,
+                    master_hits=summary_hits,
+                    matched_count=matched_count,
+                    duplicates=duplicates,
                 )
                 if saved_path:
                     final_output_path = saved_path
                 else:
-                    return False
+                    return self.complete_run(
+                        metrics, config, False, "結果を保存できません"
+                    )
             else:
-                print(f"\n6. 指定パスに結果保存: {output_path}")
-                result.to_excel(output_path, index=False)
+                self.log(f"\n6. 指定パスに結果保存: {output_path}")
+                if (
+                    output_format == "xlsx"
+                    and writer_engine == "openpyxl"
+                    and duplicates is None
+                ):
+                    result.to_excel(output_path, index=False)
+                else:
+                    # マスタの重複キーはチャンクモード・自動保存と同じく別シートに出力
+                    self.write_result_file(
+                        result,
+                        output_path,
+                        [("重複キー", duplicates)] if duplicates is not None else (),
+                        writer_engine=writer_engine,
+                        output_format=output_format,
+                    )
                 final_output_path = output_path
-                print(f"   保存完了!")
+                self.log(f"   保存完了!")
 
-            print(f"\n=== 処理完了 ===")
-            print(f"完了時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"出力ファイル: {final_output_path}")
-            print(
+            self.log(f"\n=== 処理完了 ===")
+            self.log(f"完了時刻: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            self.log(f"出力ファイル: {final_output_path}")
+            self.log(
                 f"出力ディレクトリ: {os.path.dirname(os.path.abspath(final_output_path))}"
             )
 
-            return True
+            metrics.output_path = final_output_path
+            return self.complete_run(metrics, config, True)
 
         except Exception as e:
-            print(f"\nエラーが発生しました: {e}")
-            return False
+            if writer is not None:
+                # チャンクモードの途中で失敗した場合は作成途中の結果ファイルを残さない
+                writer.abort()
+            self.log(f"\nエラーが発生しました: {e}", VERBOSITY_QUIET)
+            return self.complete_run(metrics, config, False, str(e))
+
+        finally:
+            self.verbosity = default_verbosity
 
 
 # 設定ファイル作成・読み込み機能
+
+# 1件のVLOOKUPに必須の設定項目（複数ジョブの場合は各ジョブまたは共通設定で指定）
+CONFIG_REQUIRED_KEYS = (
+    "excel1_path",
+    "excel1_sheet",
+    "excel2_path",
+    "excel2_sheet",
+    "search_col",
+    "lookup_col",
+    "return_cols",
+)
+
+
+def run_config(tool, config):
+    """設定を実行（jobsがあれば複数ジョブ、なければ1件のVLOOKUP）"""
+    if "jobs" in config:
+        return all(tool.run_jobs(config["jobs"]))
+    return tool.vlookup_with_sheets(config)
+
+
 def create_config_template():
     """設定ファイルのテンプレート作成"""
     config_template = """# Excel VLOOKUP 設定ファイル
@@ -280,14 +3008,52 @@ excel1_sheet = "Sheet1"
 excel2_path = "path/to/your/excel2.xlsx"
 excel2_sheet = "マスタ"
 
+# 複数マスタ（任意）: 指定するとexcel2_path/excel2_sheetの代わりに先頭から順に照合
+# 前のマスタで見つからなかった行だけを次のマスタで照合する（IFERRORのVLOOKUP連鎖）
+# 各マスタの項目（lookup_col等）で上記の設定を上書きできる。取得列は全マスタ共通
+# masters = [
+#     {"excel2_path": "path/to/master_a.xlsx", "excel2_sheet": "マスタ"},
+#     {"excel2_path": "path/to/master_b.xlsx", "excel2_sheet": "旧マスタ", "lookup_col": "旧コード"},
+# ]
+
 # VLOOKUP設定
-search_col = "商品コード"      # Excel1の検索キー列名
-lookup_col = "商品コード"      # Excel2の検索キー列名
+search_col = "商品コード"      # Excel1の検索キー列名（複合キーはリスト: ["顧客コード", "商品コード"]）
+lookup_col = "商品コード"      # Excel2の検索キー列名（複合キーはsearch_colと同じ順のリスト）
 return_cols = ["商品名", "価格", "カテゴリ"]  # 取得したい列名のリスト
+excel1_cols = None             # 出力に残すExcel1の列名リスト（None: 全列）
+chunk_size = None              # 例: 50000 → Excel1を指定行数ずつストリーミング処理
+lookup_engine = "merge"        # "merge": DataFrame.merge, "index": マスタIndexで行位置取得
+match_mode = "exact"           # "exact": 完全一致, "approximate": 近似一致（VLOOKUPのTRUE）
+                               # "date_range": 日付が適用期間[start_col, end_col]に含まれる行
+date_col = None                # date_range: Excel1の日付列名
+start_col = None               # date_range: マスタの開始日列名
+end_col = None                 # date_range: マスタの終了日列名（空欄は終了日なし）
+key_normalize = None           # 例: ["nfkc", "strip", "casefold", "remove_hyphen", "zfill:6"]
+duplicate_policy = "first"     # マスタの重複キー: "first" / "last" / "error"（重複があれば中止）
+                               # "aggregate:sum" / "aggregate:max" / "aggregate:concat"（重複行を集約）
+                               # 重複キーは結果ファイルの「重複キー」シートに一覧を出力
+writer_engine = "openpyxl"     # "stream" / "xlsxwriter": 大量データを省メモリで逐次書き込み
+output_format = "xlsx"         # "csv" / "parquet" / "feather"（サマリーは_summary.jsonに保存）
+output_mode = "new"            # "inject": Excel1の元ブックに取得列を追加（書式・他シートを保持）
+master_cache = False           # True: 整形済みマスタをキャッシュ, "hash": 内容ハッシュで検証
+cache_dir = None               # キャッシュ保存先（None: ~/.cache/vlookup、Windowsは%LOCALAPPDATA%\\vlookup）
+                               # pickleで保存するため共有ドライブなど他人が書き込める場所は指定しない
+verbosity = "detail"           # "normal": プレビュー表示なし, "quiet": エラーのみ表示
+metrics_summary = False        # True: 処理サマリーに段階別の処理時間・メモリを追加
+metrics_file = None            # 計測結果のJSONパス（True: 出力ファイル名_metrics.json）
+trace_memory = False           # True: tracemallocで段階内のピークメモリも計測（処理は遅くなる）
 
 # 出力設定
 auto_save_same_dir = True      # True: Excel1と同ディレクトリに自動保存, False: 手動パス指定
 output_path = "vlookup_result.xlsx"  # auto_save_same_dir=Falseの場合のみ使用
+
+# 複数ジョブ（任意）: jobsを指定すると各ジョブを順に実行
+# 上記の設定が共通の既定値となり、各ジョブの項目で上書きされる
+# 同じシートは全ジョブで一度だけ読み込み、整形済みマスタも共有する
+# jobs = [
+#     {"name": "商品名付与", "return_cols": ["商品名"]},
+#     {"name": "売上集計", "excel1_path": "path/to/sales.xlsx", "excel1_sheet": "売上"},
+# ]
 """
 
     with open("vlookup_config.py", "w", encoding="utf-8") as f:
@@ -306,17 +3072,47 @@ def load_config_from_file():
         import vlookup_config as cfg
 
         config = {
-            "excel1_path": cfg.excel1_path,
-            "excel1_sheet": cfg.excel1_sheet,
-            "excel2_path": cfg.excel2_path,
-            "excel2_sheet": cfg.excel2_sheet,
-            "search_col": cfg.search_col,
-            "lookup_col": cfg.lookup_col,
-            "return_cols": cfg.return_cols,
+            "excel1_path": getattr(cfg, "excel1_path", None),
+            "excel1_sheet": getattr(cfg, "excel1_sheet", None),
+            "excel2_path": getattr(cfg, "excel2_path", None),
+            "excel2_sheet": getattr(cfg, "excel2_sheet", None),
+            "search_col": getattr(cfg, "search_col", None),
+            "lookup_col": getattr(cfg, "lookup_col", None),
+            "return_cols": getattr(cfg, "return_cols", None),
+            "masters": getattr(cfg, "masters", None),
+            "excel1_cols": getattr(cfg, "excel1_cols", None),
+            "chunk_size": getattr(cfg, "chunk_size", None),
+            "lookup_engine": getattr(cfg, "lookup_engine", "merge"),
+            "match_mode": getattr(cfg, "match_mode", "exact"),
+            "key_normalize": getattr(cfg, "key_normalize", None),
+            "duplicate_policy": getattr(cfg, "duplicate_policy", "first"),
+            "date_col": getattr(cfg, "date_col", None),
+            "start_col": getattr(cfg, "start_col", None),
+            "end_col": getattr(cfg, "end_col", None),
+            "writer_engine": getattr(cfg, "writer_engine", "openpyxl"),
+            "output_format": getattr(cfg, "output_format", "xlsx"),
+            "output_mode": getattr(cfg, "output_mode", "new"),
+            "master_cache": getattr(cfg, "master_cache", False),
+            "cache_dir": getattr(cfg, "cache_dir", None),
+            "verbosity": getattr(cfg, "verbosity", "detail"),
+            "metrics_summary": getattr(cfg, "metrics_summary", False),
+            "metrics_file": getattr(cfg, "metrics_file", None),
+            "trace_memory": getattr(cfg, "trace_memory", False),
             "auto_save_same_dir": getattr(cfg, "auto_save_same_dir", True),
             "output_path": getattr(cfg, "output_path", None),
         }
 
+        # 複数ジョブ: ファイル直下の設定を既定値として各ジョブの設定で上書き
+        jobs = getattr(cfg, "jobs", None)
+        if jobs:
+            return {"jobs": [dict(config, **job) for job in jobs]}
+
+        missing = [key for key in CONFIG_REQUIRED_KEYS if config[key] is None]
+        if config["masters"]:
+            # 複数マスタ指定時のExcel2は各マスタの設定を使用
+            missing = [key for key in missing if key not in ("excel2_path", "excel2_sheet")]
+        if missing:
+            raise ValueError(f"設定項目がありません: {missing}")
         return config
 
     except ImportError:
@@ -372,6 +3168,8 @@ def manual_config_input():
 
 def create_sample_files():
     """サンプルファイル作成（複数シート対応）"""
+    import pandas as pd
+
     print("サンプルファイルを作成します（複数シート含む）...")
 
     # Excel1（複数シート）
@@ -436,6 +3234,8 @@ def create_sample_files():
 
 def create_business_samples():
     """実用的な業務サンプルデータ作成"""
+    import pandas as pd
+
     print("実用的な業務サンプルデータを作成します...")
 
     # 1. 営業データサンプル
@@ -956,6 +3756,8 @@ def create_business_samples():
 
 def create_sample_patterns():
     """VLOOKUPパターン別サンプル作成"""
+    import pandas as pd
+
     print("VLOOKUPパターン別サンプルを作成します...")
 
     # パターン1: 基本的なVLOOKUP
@@ -1112,6 +3914,7 @@ def create_sample_patterns():
     print("パターン1_基本VLOOKUP.xlsx     - 基本的な商品コード→商品情報")
     print("パターン2_複数列取得.xlsx      - 社員ID→氏名・部署・給与等複数情報")
     print("パターン3_データクレンジング.xlsx - スペース・大小文字問題のあるデータ")
+    print("  （key_normalize=True で空白・大小文字の違いを吸収して照合できます）")
     print("パターン4_日付データ.xlsx      - プロジェクトID→日付・予算情報")
 
 
@@ -1147,6 +3950,376 @@ def create_all_samples():
     print("\nこれらのファイルを使ってVLOOKUPの練習ができます！")
 
 
+def create_synthetic_samples(
+    rows=10000,
+    key_cardinality=None,
+    match_rate=0.9,
+    duplicate_rate=0.0,
+    key_dtype="str",
+    extra_cols=2,
+    seed=0,
+    output_dir=".",
+    prefix="synthetic",
+    writer_engine="stream",
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    性能計測用の大規模サンプル（Excel1とマスタの組）を作成
+
+    rows: Excel1の行数（1シートの上限を超える場合は複数ファイルに分割）
+    key_cardinality: マスタのユニークキー数（省略時はrowsの1/10）
+    match_rate: Excel1の行のうちマスタに存在するキーの割合（0〜1）
+    duplicate_rate: マスタに追加する重複キー行の割合（ユニークキー数に対する比率）
+    key_dtype: "str"（K000000001形式）, "int"（整数）,
+               "mixed"（マスタは整数、Excel1は数字の文字列）
+    extra_cols: Excel1・マスタそれぞれに追加する数値列の数
+    seed: 乱数シード（同じ引数なら同じデータを作成）
+    writer_engine: "stream"（openpyxl write_only）/ "xlsxwriter"（constant_memory）
+
+    chunk_size行ずつ生成して逐次書き込むため、数百万行でもメモリ使用量は一定。
+    作成したファイルパスとvlookup_with_sheets用の設定を返す
+    """
+    import numpy as np
+    import pandas as pd
+
+    if key_dtype not in SYNTHETIC_KEY_DTYPES:
+        raise ValueError(
+            f"不明なkey_dtypeです: {key_dtype}（{', '.join(SYNTHETIC_KEY_DTYPES)}）"
+        )
+    if not 0 <= match_rate <= 1:
+        raise ValueError(f"match_rateは0〜1で指定してください: {match_rate}")
+    if duplicate_rate < 0:
+        raise ValueError(f"duplicate_rateは0以上で指定してください: {duplicate_rate}")
+    writer_classes = {
+        "stream": StreamingExcelWriter,
+        "xlsxwriter": XlsxwriterStreamingWriter,
+    }
+    if writer_engine not in writer_classes:
+        raise ValueError(
+            f"writer_engineは{', '.join(writer_classes)}のいずれかを指定してください"
+        )
+    writer_class = writer_classes[writer_engine]
+
+    if key_cardinality is None:
+        key_cardinality = max(1, rows // 10)
+    duplicate_count = int(key_cardinality * duplicate_rate)
+    master_rows = key_cardinality + duplicate_count
+    sheet_capacity = EXCEL_MAX_ROWS - 1  # ヘッダー行を除く
+    if master_rows > sheet_capacity:
+        raise ValueError(
+            f"マスタが1シートの上限を超えます: {master_rows}行（上限{sheet_capacity}行）"
+        )
+
+    def format_keys(ids, as_string):
+        if not as_string:
+            return ids
+        if key_dtype == "mixed":
+            return ids.astype(str)
+        return np.char.add("K", np.char.zfill(ids.astype(str), 9))
+
+    def extra_columns(prefix_name, n):
+        return {
+            f"{prefix_name}{i}": np.round(rng.random(n) * 1000, 2)
+            for i in range(1, extra_cols + 1)
+        }
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    categories = np.array(["食品", "日用品", "家電", "衣料", "文具"])
+
+    print(f"=== 大規模サンプル作成 (seed={seed}) ===")
+    print(f"Excel1: {rows}行 / マスタ: {master_rows}行（ユニークキー{key_cardinality}）")
+    print(f"マッチ率: {match_rate:.0%} / 重複率: {duplicate_rate:.0%} / キー: {key_dtype}")
+
+    # マスタ: 全ユニークキー + 重複キー行をシャッフル
+    master_ids = rng.permutation(
+        np.concatenate(
+            [
+                np.arange(key_cardinality),
+                rng.integers(0, key_cardinality, duplicate_count),
+            ]
+        )
+    )
+    excel2_path = os.path.join(output_dir, f"{prefix}_master.xlsx")
+    writer = writer_class(excel2_path, sheet_name="マスタ")
+    for start in range(0, master_rows, chunk_size):
+        ids = master_ids[start : start + chunk_size]
+        chunk = pd.DataFrame(
+            {
+                "キー": format_keys(ids, key_dtype == "str"),
+                "名称": np.char.add("商品", ids.astype(str)),
+                "価格": rng.integers(100, 100000, len(ids)),
+                "カテゴリ": categories[ids % len(categories)],
+                **extra_columns("属性", len(ids)),
+            }
+        )
+        writer.write_dataframe(chunk)
+    writer.close()
+    print(f"作成: {excel2_path}")
+
+    # Excel1: マッチしない行はマスタに存在しない番号（key_cardinality以上）のキー
+    file_count = max(1, -(-rows // sheet_capacity))
+    excel1_paths = []
+    row_id = 0
+    for file_index in range(1, file_count + 1):
+        if file_count == 1:
+            excel1_path = os.path.join(output_dir, f"{prefix}_excel1.xlsx")
+        else:
+            excel1_path = os.path.join(
+                output_dir, f"{prefix}_excel1_part{file_index:02d}.xlsx"
+            )
+        file_rows = min(sheet_capacity, rows - row_id)
+        writer = writer_class(excel1_path, sheet_name="データ")
+        for start in range(0, file_rows, chunk_size):
+            n = min(chunk_size, file_rows - start)
+            matched = rng.random(n) < match_rate
+            ids = np.where(
+                matched,
+                rng.integers(0, key_cardinality, n),
+                rng.integers(key_cardinality, 2 * key_cardinality, n),
+            )
+            chunk = pd.DataFrame(
+                {
+                    "明細ID": np.arange(row_id + 1, row_id + n + 1),
+                    "キー": format_keys(ids, key_dtype != "int"),
+                    "数量": rng.integers(1, 100, n),
+                    **extra_columns("値", n),
+                }
+            )
+            writer.write_dataframe(chunk)
+            row_id += n
+        if file_rows == 0:
+            writer.write_dataframe(
+                pd.DataFrame(columns=["明細ID", "キー", "数量", *extra_columns("値", 0)])
+            )
+        writer.close()
+        excel1_paths.append(excel1_path)
+        print(f"作成: {excel1_path}（{file_rows}行）")
+
+    config = {
+        "excel1_path": excel1_paths[0],
+        "excel1_sheet": "データ",
+        "excel2_path": excel2_path,
+        "excel2_sheet": "マスタ",
+        "search_col": "キー",
+        "lookup_col": "キー",
+        "return_cols": ["名称", "価格", "カテゴリ"],
+    }
+    return {"excel1_paths": excel1_paths, "excel2_path": excel2_path, "config": config}
+
+
+def benchmark_lookup_engines(rows=1000000, master_rows=100000, repeat=3, seed=0):
+    """
+    結合エンジン（merge / index）の処理時間を比較
+
+    メモリ上に作成したデータで結合処理のみを計測する（Excel読み書きは含まない）
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    master_keys = pd.Series([f"K{i:08d}" for i in range(master_rows)])
+    master = PreparedMaster(
+        pd.DataFrame(
+            {
+                "キー": master_keys,
+                "名称": master_keys.str.replace("K", "名称", regex=False),
+                "価格": rng.integers(100, 100000, master_rows),
+            }
+        ),
+        "キー",
+        ["名称", "価格"],
+    )
+    # 約9割がマスタに存在するキー
+    key_ids = rng.integers(0, int(master_rows * 1.1), rows)
+    df1 = pd.DataFrame(
+        {
+            "キー": [f"K{i:08d}" for i in key_ids],
+            "数量": rng.integers(1, 100, rows),
+        }
+    )
+
+    tool = ExcelSheetVLOOKUP()
+    print(f"=== 結合エンジン比較: Excel1 {rows}行 / マスタ {master_rows}行 ===")
+    timings = {}
+    for engine in LOOKUP_ENGINES:
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            tool.lookup_dataframe(df1, "キー", master, engine=engine)
+            elapsed.append(time.perf_counter() - start)
+        timings[engine] = min(elapsed)
+        print(f"{engine:>6}: {timings[engine]:.3f}秒（{repeat}回中の最速）")
+
+    return timings
+
+
+def benchmark_pipeline(
+    sizes=(10000, 100000),
+    match_rates=(0.5, 0.9),
+    lookup_engines=LOOKUP_ENGINES,
+    writer_engines=("openpyxl", "stream"),
+    repeat=1,
+    seed=0,
+    work_dir=None,
+    output_json=None,
+):
+    """
+    VLOOKUP処理全体（読み込み・マスタ整形・結合・書き込み）の処理時間を計測
+
+    サイズ・マッチ率ごとにcreate_synthetic_samplesでサンプルを作成し、
+    結合エンジン×書き込み方式の組み合わせでvlookup_with_sheetsを実行する。
+    段階ごとにrepeat回中の最速値を記録し、結果をJSONファイルに保存する
+    （output_json省略時はカレントディレクトリのvlookup_benchmark_日時.json）
+
+    work_dir: サンプル・結果ファイルの作成先（省略時は一時ディレクトリを使用し、終了後に削除）
+    """
+    import platform
+    import shutil
+    import tempfile
+
+    import pandas as pd
+
+    # VlookupResultの段階名と計測項目の対応
+    stage_names = {
+        "1. Excel1読み込み": "read",
+        "2. Excel2読み込み": "prepare",
+        "4. VLOOKUP実行": "join",
+        "6. 結果保存": "write",
+    }
+
+    if output_json is None:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_json = f"vlookup_benchmark_{timestamp}.json"
+
+    temporary = work_dir is None
+    if temporary:
+        work_dir = tempfile.mkdtemp(prefix="vlookup_benchmark_")
+
+    runs = []
+    try:
+        for rows in sizes:
+            for match_rate in match_rates:
+                sample_dir = os.path.join(work_dir, f"rows{rows}_match{match_rate}")
+                with redirect_stdout(io.StringIO()):
+                    samples = create_synthetic_samples(
+                        rows=rows,
+                        match_rate=match_rate,
+                        seed=seed,
+                        output_dir=sample_dir,
+                    )
+                print(f"=== Excel1 {rows}行 / マッチ率 {match_rate:.0%} ===")
+
+                for lookup_engine in lookup_engines:
+                    for writer_engine in writer_engines:
+                        best = {}
+                        for i in range(repeat):
+                            config = dict(samples["config"])
+                            config.update(
+                                {
+                                    "lookup_engine": lookup_engine,
+                                    "writer_engine": writer_engine,
+                                    "auto_save_same_dir": False,
+                                    "output_path": os.path.join(
+                                        sample_dir,
+                                        f"result_{lookup_engine}_{writer_engine}_{i}.xlsx",
+                                    ),
+                                    "verbosity": "quiet",
+                                }
+                            )
+                            result = ExcelSheetVLOOKUP().vlookup_with_sheets(config)
+                            if not result:
+                                raise RuntimeError(
+                                    f"ベンチマーク実行に失敗しました: {result.error}"
+                                )
+                            timings = {
+                                stage_names[stage["stage"]]: stage["wall_sec"]
+                                for stage in result.stages
+                                if stage["stage"] in stage_names
+                            }
+                            timings["total"] = result.total_wall_sec
+                            for name, value in timings.items():
+                                best[name] = min(best.get(name, value), value)
+
+                        run = {
+                            "rows": rows,
+                            "match_rate": match_rate,
+                            "lookup_engine": lookup_engine,
+                            "writer_engine": writer_engine,
+                            "repeat": repeat,
+                            "seconds": {name: round(v, 6) for name, v in best.items()},
+                        }
+                        runs.append(run)
+                        print(
+                            f"{lookup_engine:>6} / {writer_engine:<10}: "
+                            + ", ".join(
+                                f"{name} {value:.3f}秒" for name, value in best.items()
+                            )
+                        )
+    finally:
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+        },
+        "seed": seed,
+        "runs": runs,
+    }
+    with open(output_json, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"計測結果保存: {output_json}")
+
+    return report
+
+
+def benchmark_startup(repeat=5):
+    """
+    起動時間を計測（新しいPythonプロセスで各処理を実行し、最速値を表示）
+
+    pandas を読み込まない起動経路（モジュール読み込み・--help）と
+    pandas 読み込みを含む経路を比較する
+    """
+    import subprocess
+
+    script_path = os.path.abspath(__file__)
+    module_dir = os.path.dirname(script_path)
+    module_name = os.path.splitext(os.path.basename(script_path))[0]
+    commands = {
+        "Python起動のみ": [sys.executable, "-c", "pass"],
+        "モジュール読み込み": [sys.executable, "-c", f"import {module_name}"],
+        "--help表示": [sys.executable, script_path, "--help"],
+        "pandas読み込み": [
+            sys.executable,
+            "-c",
+            f"import {module_name}, pandas, openpyxl",
+        ],
+    }
+
+    print(f"=== 起動時間: {repeat}回中の最速 ===")
+    timings = {}
+    for label, command in commands.items():
+        elapsed = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(
+                command,
+                cwd=module_dir,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+            elapsed.append(time.perf_counter() - start)
+        timings[label] = min(elapsed)
+        print(f"{label:<12}: {timings[label] * 1000:.0f}ms")
+
+    return timings
+
+
 def main():
     """メイン処理"""
     vlookup_tool = ExcelSheetVLOOKUP()
@@ -1249,7 +4422,7 @@ def main():
         if config:
             # 同ディレクトリ保存をデフォルトに
             config["auto_save_same_dir"] = config.get("auto_save_same_dir", True)
-            vlookup_tool.vlookup_with_sheets(config)
+            run_config(vlookup_tool, config)
         else:
             print("設定ファイルを先に作成してください（選択肢6）")
 
@@ -1268,9 +4441,17 @@ def main():
         lookup_col = input("マスタ検索キー列名: ")
         return_cols_str = input("取得列名（カンマ区切り）: ")
         return_cols = [col.strip() for col in return_cols_str.split(",")]
+        workers_str = input("並列プロセス数（Enterで1）: ")
+        workers = int(workers_str) if workers_str.strip() else 1
 
         batch_process_directory(
-            directory, excel2_path, excel2_sheet, search_col, lookup_col, return_cols
+            directory,
+            excel2_path,
+            excel2_sheet,
+            search_col,
+            lookup_col,
+            return_cols,
+            workers=workers,
         )
 
     else:
@@ -1288,6 +4469,23 @@ def quick_sheet_vlookup(
     return_cols,
     output_path=None,
     auto_save_same_dir=True,
+    masters=None,
+    excel1_cols=None,
+    chunk_size=None,
+    lookup_engine="merge",
+    match_mode="exact",
+    key_normalize=None,
+    date_col=None,
+    start_col=None,
+    end_col=None,
+    duplicate_policy="first",
+    writer_engine="openpyxl",
+    output_format="xlsx",
+    output_mode="new",
+    verbosity="detail",
+    metrics_summary=False,
+    metrics_file=None,
+    trace_memory=False,
 ):
     """
     簡単実行用の関数
@@ -1317,13 +4515,87 @@ def quick_sheet_vlookup(
         "return_cols": return_cols,
         "output_path": output_path,
         "auto_save_same_dir": auto_save_same_dir,
+        "masters": masters,
+        "excel1_cols": excel1_cols,
+        "chunk_size": chunk_size,
+        "lookup_engine": lookup_engine,
+        "match_mode": match_mode,
+        "key_normalize": key_normalize,
+        "date_col": date_col,
+        "start_col": start_col,
+        "end_col": end_col,
+        "duplicate_policy": duplicate_policy,
+        "writer_engine": writer_engine,
+        "output_format": output_format,
+        "output_mode": output_mode,
+        "verbosity": verbosity,
+        "metrics_summary": metrics_summary,
+        "metrics_file": metrics_file,
+        "trace_memory": trace_memory,
     }
 
     return tool.vlookup_with_sheets(config)
 
 
+def process_batch_file(tool, excel1_path, search_col, master, options=None):
+    """一括処理の1ファイル分（最初のシートを準備済みマスタでVLOOKUP）"""
+    try:
+        # 最初のシートを使用（開いたハンドルはvlookup_with_sheetsで再利用）
+        xl_file = tool.open_workbook(excel1_path)
+        first_sheet = xl_file.sheet_names[0]
+
+        config = {
+            "excel1_path": excel1_path,
+            "excel1_sheet": first_sheet,
+            "search_col": search_col,
+            "auto_save_same_dir": True,
+        }
+        config.update(options or {})
+
+        success = tool.vlookup_with_sheets(config, master=master)
+
+        # quiet時は見出しを表示しないため、失敗時はファイル名も表示
+        if success:
+            tool.log(f"✅ 処理完了")
+        else:
+            tool.log(f"❌ 処理失敗: {os.path.basename(excel1_path)}", VERBOSITY_QUIET)
+        return bool(success)
+
+    except Exception as e:
+        tool.close_workbooks()
+        tool.log(f"❌ エラー: {os.path.basename(excel1_path)}: {e}", VERBOSITY_QUIET)
+        return False
+
+
+# 並列処理用：各ワーカープロセスで共有する準備済みマスタ
+_worker_master = None
+
+
+def _init_batch_worker(master):
+    """ワーカープロセス初期化（マスタはプロセスごとに一度だけ受け取る）"""
+    global _worker_master
+    _worker_master = master
+
+
+def _run_batch_worker(excel1_path, search_col, options=None):
+    """ワーカープロセスで1ファイルを処理し、(成否, 出力ログ)を返す"""
+    log = io.StringIO()
+    tool = ExcelSheetVLOOKUP(verbosity=(options or {}).get("verbosity", "detail"))
+    with redirect_stdout(log):
+        success = process_batch_file(tool, excel1_path, search_col, _worker_master, options)
+    return success, log.getvalue()
+
+
 def batch_process_directory(
-    directory_path, excel2_path, excel2_sheet, search_col, lookup_col, return_cols
+    directory_path,
+    excel2_path,
+    excel2_sheet,
+    search_col,
+    lookup_col,
+    return_cols,
+    master=None,
+    workers=1,
+    options=None,
 ):
     """
     ディレクトリ内の全Excelファイルを一括処理
@@ -1335,12 +4607,18 @@ def batch_process_directory(
     search_col: 検索キー列名
     lookup_col: マスタ検索キー列名
     return_cols: 取得列リスト
-    """
+    master: 準備済みマスタ（PreparedMaster）。指定時はexcel2_path等は不要
+    workers: 並列処理するプロセス数（1: 逐次処理）
+    options: 各ファイルのVLOOKUP設定に追加する項目（chunk_size, output_format等）
 
-    print(f"=== ディレクトリ一括処理開始 ===")
-    print(f"対象ディレクトリ: {directory_path}")
+    マスタは最初に一度だけ読み込み、全ファイルで再利用する
+    （並列処理時も各ワーカープロセスへ一度だけ渡す）
+    """
+    from concurrent.futures import ProcessPoolExecutor
 
-    tool = ExcelSheetVLOOKUP()
+    tool = ExcelSheetVLOOKUP(verbosity=(options or {}).get("verbosity", "detail"))
+    tool.log(f"=== ディレクトリ一括処理開始 ===")
+    tool.log(f"対象ディレクトリ: {directory_path}")
     processed_files = []
     error_files = []
 
@@ -1351,53 +4629,467 @@ def batch_process_directory(
             full_path = os.path.join(directory_path, file)
             excel_files.append(full_path)
 
-    print(f"見つかったExcelファイル: {len(excel_files)}個")
-
-    for i, excel1_path in enumerate(excel_files, 1):
-        print(f"\n--- {i}/{len(excel_files)}: {os.path.basename(excel1_path)} ---")
+    tool.log(f"見つかったExcelファイル: {len(excel_files)}個")
 
+    # マスタを一度だけ読み込んで整形
+    if master is None:
+        tool.log(f"\n--- マスタ読み込み ---")
         try:
-            # 最初のシートを使用
-            xl_file = pd.ExcelFile(excel1_path)
-            first_sheet = xl_file.sheet_names[0]
-
-            config = {
-                "excel1_path": excel1_path,
-                "excel1_sheet": first_sheet,
-                "excel2_path": excel2_path,
-                "excel2_sheet": excel2_sheet,
-                "search_col": search_col,
-                "lookup_col": lookup_col,
-                "return_cols": return_cols,
-                "auto_save_same_dir": True,
-            }
+            master_config = dict(options or {})
+            master_config.update(
+                {
+                    "excel2_path": excel2_path,
+                    "excel2_sheet": excel2_sheet,
+                    "lookup_col": lookup_col,
+                    "return_cols": return_cols,
+                }
+            )
+            with tool.reusing_workbooks():
+                master = tool.prepare_master(master_config)
+        except Exception as e:
+            tool.log(f"❌ マスタ読み込みエラー: {e}", VERBOSITY_QUIET)
+            return processed_files, list(excel_files)
+
+    if workers > 1 and len(excel_files) > 1:
+        # 並列処理（ログはファイル単位にまとめ、ファイル順に表示）
+        tool.log(f"並列処理: {workers}プロセス")
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(master,),
+        ) as executor:
+            futures = [
+                executor.submit(_run_batch_worker, excel1_path, search_col, options)
+                for excel1_path in excel_files
+            ]
+            for i, (excel1_path, future) in enumerate(zip(excel_files, futures), 1):
+                tool.log(
+                    f"\n--- {i}/{len(excel_files)}: {os.path.basename(excel1_path)} ---"
+                )
+                try:
+                    success, log = future.result()
+                    print(log, end="")
+                except Exception as e:
+                    success = False
+                    tool.log(
+                        f"❌ エラー: {os.path.basename(excel1_path)}: {e}", VERBOSITY_QUIET
+                    )
 
-            success = tool.vlookup_with_sheets(config)
+                if success:
+                    processed_files.append(excel1_path)
+                else:
+                    error_files.append(excel1_path)
+    else:
+        for i, excel1_path in enumerate(excel_files, 1):
+            tool.log(f"\n--- {i}/{len(excel_files)}: {os.path.basename(excel1_path)} ---")
 
-            if success:
+            if process_batch_file(tool, excel1_path, search_col, master, options):
                 processed_files.append(excel1_path)
-                print(f"✅ 処理完了")
             else:
                 error_files.append(excel1_path)
-                print(f"❌ 処理失敗")
 
-        except Exception as e:
-            error_files.append(excel1_path)
-            print(f"❌ エラー: {e}")
-
-    print(f"\n=== 一括処理完了 ===")
-    print(f"処理成功: {len(processed_files)}ファイル")
-    print(f"処理失敗: {len(error_files)}ファイル")
+    tool.log(f"\n=== 一括処理完了 ===")
+    tool.log(f"処理成功: {len(processed_files)}ファイル")
+    tool.log(f"処理失敗: {len(error_files)}ファイル")
 
     if error_files:
-        print(f"\n失敗ファイル:")
+        tool.log(f"\n失敗ファイル:", VERBOSITY_QUIET)
         for file in error_files:
-            print(f"  - {os.path.basename(file)}")
+            tool.log(f"  - {os.path.basename(file)}", VERBOSITY_QUIET)
 
     return processed_files, error_files
 
 
+def _split_columns(value):
+    """カンマ区切りの列名をリストに変換"""
+    return [col.strip() for col in value.split(",") if col.strip()]
+
+
+def _key_columns_arg(value):
+    """検索キー列の引数（カンマ区切りで複数指定した場合は複合キー）"""
+    cols = _split_columns(value)
+    return cols if len(cols) > 1 else value.strip()
+
+
+def build_arg_parser():
+    """コマンドライン引数の定義"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="excel_sheet_vlookup.py",
+        description="Excel VLOOKUP ツール（引数なしで実行すると対話メニューを表示）",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="コマンド")
+    subparsers.required = True
+
+    # 処理状況を表示するコマンド（lookup / batch / run-config）共通のオプション
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-q", "--quiet", action="store_true", help="エラー・警告のみ表示（--verbosity quietと同じ）"
+    )
+
+    # VLOOKUP実行系コマンド共通のオプション
+    lookup_options = argparse.ArgumentParser(add_help=False)
+    lookup_options.add_argument(
+        "--chunk-size", type=int, help="Excel1を指定行数ずつストリーミング処理"
+    )
+    lookup_options.add_argument(
+        "--format",
+        dest="output_format",
+        choices=list(OUTPUT_FORMATS),
+        default="xlsx",
+        help="出力形式（既定: xlsx）",
+    )
+    lookup_options.add_argument(
+        "--engine",
+        dest="lookup_engine",
+        choices=LOOKUP_ENGINES,
+        default="merge",
+        help="結合エンジン（既定: merge）",
+    )
+    lookup_options.add_argument(
+        "--match-mode",
+        choices=MATCH_MODES,
+        default="exact",
+        help="照合方法（既定: exact）",
+    )
+    lookup_options.add_argument("--date-col", help="date_range: Excel1の日付列名")
+    lookup_options.add_argument("--start-col", help="date_range: マスタの開始日列名")
+    lookup_options.add_argument("--end-col", help="date_range: マスタの終了日列名")
+    lookup_options.add_argument(
+        "--duplicate-policy",
+        help="マスタの重複キーの扱い（first / last / error / aggregate:sum|max|concat）",
+    )
+    lookup_options.add_argument(
+        "--key-normalize",
+        type=_split_columns,
+        help="照合時のキー正規化（カンマ区切り: nfkc,strip,casefold,remove_hyphen,zfill:N）",
+    )
+    lookup_options.add_argument(
+        "--writer",
+        dest="writer_engine",
+        choices=WRITER_ENGINES,
+        default="openpyxl",
+        help="Excel書き込み方式（既定: openpyxl）",
+    )
+    lookup_options.add_argument(
+        "--verbosity",
+        choices=list(VERBOSITY_LEVELS),
+        help="表示レベル（既定: detail、--quiet指定時はquiet）",
+    )
+    lookup_options.add_argument(
+        "--metrics-summary",
+        action="store_true",
+        help="処理サマリーに段階別の処理時間・メモリを追加",
+    )
+    lookup_options.add_argument(
+        "--metrics-file",
+        help="段階別の計測結果をJSONで保存（batchでは各出力ファイル名_metrics.jsonに保存）",
+    )
+    lookup_options.add_argument(
+        "--master-cache",
+        choices=["mtime", "hash"],
+        help="整形済みマスタをキャッシュ（mtime: 更新日時で検証, hash: 内容ハッシュで検証）",
+    )
+
+    master_options = argparse.ArgumentParser(add_help=False)
+    master_options.add_argument("--excel2", required=True, help="マスタファイルパス")
+    master_options.add_argument("--sheet2", required=True, help="マスタシート名")
+    master_options.add_argument(
+        "--search-col",
+        type=_key_columns_arg,
+        required=True,
+        help="検索キー列名（カンマ区切りで複合キー）",
+    )
+    master_options.add_argument(
+        "--lookup-col",
+        type=_key_columns_arg,
+        help="マスタ検索キー列名（省略時は--search-colと同じ）",
+    )
+    master_options.add_argument(
+        "--return-cols",
+        type=_split_columns,
+        required=True,
+        help="取得列名（カンマ区切り）",
+    )
+
+    lookup_parser = subparsers.add_parser(
+        "lookup",
+        parents=[common, lookup_options, master_options],
+        help="1ファイルのVLOOKUP実行（quick_sheet_vlookup）",
+    )
+    lookup_parser.add_argument("--excel1", required=True, help="Excel1ファイルパス")
+    lookup_parser.add_argument("--sheet1", required=True, help="Excel1シート名")
+    lookup_parser.add_argument(
+        "--excel1-cols", type=_split_columns, help="出力に残すExcel1の列（カンマ区切り）"
+    )
+    lookup_parser.add_argument(
+        "-o", "--output", help="出力ファイルパス（省略時はExcel1と同じディレクトリ）"
+    )
+    lookup_parser.add_argument(
+        "--inject",
+        action="store_true",
+        help="Excel1の元ブックに取得列を追加して保存",
+    )
+    lookup_parser.add_argument(
+        "--fallback",
+        nargs=2,
+        action="append",
+        metavar=("EXCEL", "SHEET"),
+        help="--excel2で見つからなかった行を照合する次のマスタ（複数指定で順に照合）",
+    )
+    lookup_parser.set_defaults(handler=_cli_lookup)
+
+    batch_parser = subparsers.add_parser(
+        "batch",
+        parents=[common, lookup_options, master_options],
+        help="ディレクトリ内の全Excelファイルを一括処理",
+    )
+    batch_parser.add_argument("directory", help="処理対象ディレクトリ")
+    batch_parser.add_argument(
+        "-w", "--workers", type=int, default=1, help="並列プロセス数（既定: 1）"
+    )
+    batch_parser.set_defaults(handler=_cli_batch)
+
+    samples_parser = subparsers.add_parser(
+        "samples", help="サンプルExcelファイル作成"
+    )
+    samples_parser.add_argument(
+        "kind",
+        choices=["simple", "business", "pattern", "all"],
+        nargs="?",
+        default="all",
+        help="作成するサンプル（既定: all）",
+    )
+    samples_parser.set_defaults(handler=_cli_samples)
+
+    synthetic_parser = subparsers.add_parser(
+        "synthetic", help="性能計測用の大規模サンプル作成"
+    )
+    synthetic_parser.add_argument("--rows", type=int, default=10000, help="Excel1の行数")
+    synthetic_parser.add_argument(
+        "--cardinality", type=int, help="マスタのユニークキー数（既定: 行数の1/10）"
+    )
+    synthetic_parser.add_argument(
+        "--match-rate", type=float, default=0.9, help="マスタに存在するキーの割合"
+    )
+    synthetic_parser.add_argument(
+        "--duplicate-rate", type=float, default=0.0, help="マスタの重複キー行の割合"
+    )
+    synthetic_parser.add_argument(
+        "--key-dtype", choices=SYNTHETIC_KEY_DTYPES, default="str", help="検索キーの型"
+    )
+    synthetic_parser.add_argument(
+        "--extra-cols", type=int, default=2, help="追加する数値列の数"
+    )
+    synthetic_parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    synthetic_parser.add_argument("--output-dir", default=".", help="出力ディレクトリ")
+    synthetic_parser.add_argument("--prefix", default="synthetic", help="ファイル名の接頭辞")
+    synthetic_parser.add_argument(
+        "--writer",
+        dest="writer_engine",
+        choices=["stream", "xlsxwriter"],
+        default="stream",
+        help="書き込み方式（既定: stream）",
+    )
+    synthetic_parser.set_defaults(handler=_cli_synthetic)
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark", help="VLOOKUP処理全体の処理時間を計測"
+    )
+    benchmark_parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in _split_columns(value)],
+        default=[10000, 100000],
+        help="Excel1の行数（カンマ区切り、既定: 10000,100000）",
+    )
+    benchmark_parser.add_argument(
+        "--match-rates",
+        type=lambda value: [float(rate) for rate in _split_columns(value)],
+        default=[0.5, 0.9],
+        help="マッチ率（カンマ区切り、既定: 0.5,0.9）",
+    )
+    benchmark_parser.add_argument(
+        "--engines",
+        type=_split_columns,
+        default=list(LOOKUP_ENGINES),
+        help="結合エンジン（カンマ区切り、既定: merge,index）",
+    )
+    benchmark_parser.add_argument(
+        "--writers",
+        type=_split_columns,
+        default=["openpyxl", "stream"],
+        help="書き込み方式（カンマ区切り、既定: openpyxl,stream）",
+    )
+    benchmark_parser.add_argument("--repeat", type=int, default=1, help="繰り返し回数")
+    benchmark_parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    benchmark_parser.add_argument(
+        "--work-dir", help="サンプル作成先（省略時は一時ディレクトリ）"
+    )
+    benchmark_parser.add_argument("-o", "--output", help="結果JSONの保存先")
+    benchmark_parser.set_defaults(handler=_cli_benchmark)
+
+    template_parser = subparsers.add_parser(
+        "config-template", help="設定ファイル(vlookup_config.py)作成"
+    )
+    template_parser.set_defaults(handler=lambda args: create_config_template() or True)
+
+    run_config_parser = subparsers.add_parser(
+        "run-config", parents=[common], help="設定ファイル(vlookup_config.py)でVLOOKUP実行"
+    )
+    run_config_parser.set_defaults(handler=_cli_run_config)
+
+    return parser
+
+
+def _cli_lookup_options(args):
+    """VLOOKUP実行系コマンドの共通オプションを設定項目に変換"""
+    options = {
+        "output_format": args.output_format,
+        "lookup_engine": args.lookup_engine,
+        "match_mode": args.match_mode,
+        "writer_engine": args.writer_engine,
+        "metrics_summary": args.metrics_summary,
+    }
+    if args.metrics_file:
+        options["metrics_file"] = args.metrics_file
+    if args.key_normalize:
+        options["key_normalize"] = args.key_normalize
+    for key in ("date_col", "start_col", "end_col", "duplicate_policy"):
+        if getattr(args, key):
+            options[key] = getattr(args, key)
+    if args.chunk_size:
+        options["chunk_size"] = args.chunk_size
+    if args.master_cache:
+        options["master_cache"] = "hash" if args.master_cache == "hash" else True
+    # --quiet時はプレビュー・診断用の計算も行わない
+    verbosity = "quiet" if args.quiet else args.verbosity
+    if verbosity:
+        options["verbosity"] = verbosity
+    return options
+
+
+def _cli_lookup(args):
+    config = {
+        "excel1_path": args.excel1,
+        "excel1_sheet": args.sheet1,
+        "excel2_path": args.excel2,
+        "excel2_sheet": args.sheet2,
+        "search_col": args.search_col,
+        "lookup_col": args.lookup_col or args.search_col,
+        "return_cols": args.return_cols,
+        "excel1_cols": args.excel1_cols,
+        "output_path": args.output,
+        "auto_save_same_dir": not args.output,
+        "output_mode": "inject" if args.inject else "new",
+    }
+    if args.fallback:
+        config["masters"] = [
+            {"excel2_path": path, "excel2_sheet": sheet_name}
+            for path, sheet_name in [(args.excel2, args.sheet2)] + args.fallback
+        ]
+    config.update(_cli_lookup_options(args))
+    return ExcelSheetVLOOKUP().vlookup_with_sheets(config)
+
+
+def _cli_batch(args):
+    options = _cli_lookup_options(args)
+    if "metrics_file" in options:
+        # ファイルごとに出力ファイル名_metrics.jsonへ保存
+        options["metrics_file"] = True
+    processed_files, error_files = batch_process_directory(
+        args.directory,
+        args.excel2,
+        args.sheet2,
+        args.search_col,
+        args.lookup_col or args.search_col,
+        args.return_cols,
+        workers=args.workers,
+        options=options,
+    )
+    return not error_files
+
+
+def _cli_samples(args):
+    {
+        "simple": create_sample_files,
+        "business": create_business_samples,
+        "pattern": create_sample_patterns,
+        "all": create_all_samples,
+    }[args.kind]()
+    return True
+
+
+def _cli_synthetic(args):
+    create_synthetic_samples(
+        rows=args.rows,
+        key_cardinality=args.cardinality,
+        match_rate=args.match_rate,
+        duplicate_rate=args.duplicate_rate,
+        key_dtype=args.key_dtype,
+        extra_cols=args.extra_cols,
+        seed=args.seed,
+        output_dir=args.output_dir,
+        prefix=args.prefix,
+        writer_engine=args.writer_engine,
+    )
+    return True
+
+
+def _cli_benchmark(args):
+    benchmark_pipeline(
+        sizes=args.sizes,
+        match_rates=args.match_rates,
+        lookup_engines=args.engines,
+        writer_engines=args.writers,
+        repeat=args.repeat,
+        seed=args.seed,
+        work_dir=args.work_dir,
+        output_json=args.output,
+    )
+    return True
+
+
+def _cli_run_config(args):
+    config = load_config_from_file()
+    if not config:
+        return False
+    if args.quiet:
+        for job_config in [config] + config.get("jobs", []):
+            job_config["verbosity"] = "quiet"
+    return run_config(ExcelSheetVLOOKUP(verbosity=config.get("verbosity", "detail")), config)
+
+
+def cli(argv=None):
+    """
+    コマンドライン実行（cron・ジョブ実行用）
+
+    戻り値は終了コード（0: 成功, 1: 処理失敗, 2: 引数エラー）
+    """
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+
+    # --quietは表示レベルとして各処理に渡す（エラー・警告は表示したまま）
+    try:
+        success = args.handler(args)
+    except Exception as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+
+    if not success:
+        error = getattr(success, "error", None)
+        if error:
+            print(f"エラー: {error}", file=sys.stderr)
+        print(f"処理に失敗しました: {args.command}", file=sys.stderr)
+        return 1
+    return 0
+
+
 if __name__ == "__main__":
+    # 引数付きで実行した場合はコマンドラインモード、引数なしは対話メニュー
+    if len(sys.argv) > 1:
+        sys.exit(cli())
+
     main()
 
     # 直接実行の例（コメントアウトを外して使用）
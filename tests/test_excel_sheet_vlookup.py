@@ -0,0 +1,468 @@
+"""
+excel_sheet_vlookup の回帰テスト
+
+実行: python -m unittest discover -s tests（pytestでも実行可）
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import excel_sheet_vlookup as vlookup  # noqa: E402
+
+
+def values(series):
+    """比較用に欠損値をNoneにしたリスト"""
+    return [None if pd.isna(value) else value for value in series]
+
+
+class LookupTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tool = vlookup.ExcelSheetVLOOKUP(verbosity="quiet")
+
+    def prepared(self, df, lookup_col, return_cols, range_cols=None, policy="first"):
+        data, duplicates = self.tool.filter_master(
+            df, lookup_col, return_cols, range_cols, policy
+        )
+        return vlookup.PreparedMaster(
+            data,
+            lookup_col,
+            return_cols,
+            range_cols=range_cols,
+            duplicates=duplicates,
+            duplicate_policy=policy,
+        )
+
+
+class CompositeKeyTest(LookupTestCase):
+    def setUp(self):
+        super().setUp()
+        # 同じ商品コードでも顧客が違えば別の行。キーに空欄がある行は照合対象外
+        self.master = self.prepared(
+            pd.DataFrame(
+                {
+                    "顧客コード": ["C1", "C1", "C2", "C2", None],
+                    "商品コード": [1, 2, 1, 2, 1],
+                    "単価": [100, 200, 110, 210, 999],
+                }
+            ),
+            ["顧客コード", "商品コード"],
+            ["単価"],
+        )
+
+    def test_exact(self):
+        df1 = pd.DataFrame(
+            {"顧客コード": ["C1", "C2", "C1", "C3", None], "商品コード": [2, 1, 3, 1, 1]}
+        )
+        result = self.tool.lookup_dataframe(df1, ["顧客コード", "商品コード"], self.master)
+        self.assertEqual(values(result["単価"]), [200, 110, None, None, None])
+
+    def test_key_types_differ(self):
+        df1 = pd.DataFrame({"顧客コード": ["C2", "C1"], "商品コード": ["2", "1"]})
+        result = self.tool.lookup_dataframe(df1, ["顧客コード", "商品コード"], self.master)
+        self.assertEqual(values(result["単価"]), [210, 100])
+
+
+class DateRangeTest(LookupTestCase):
+    def periods(self, rows):
+        df = pd.DataFrame(rows, columns=["拠点", "商品コード", "開始日", "終了日", "単価"])
+        df["開始日"] = pd.to_datetime(df["開始日"])
+        df["終了日"] = pd.to_datetime(df["終了日"])
+        return df
+
+    def lookup(self, master, df1, search_col):
+        result = self.tool.lookup_dataframe(
+            df1, search_col, master, match_mode="date_range", date_col="日付"
+        )
+        return values(result["単価"])
+
+    def test_single_key(self):
+        master = self.prepared(
+            self.periods(
+                [
+                    ("東京", "A", "2024-01-01", "2024-03-31", 100),
+                    ("東京", "A", "2024-04-01", None, 120),
+                ]
+            ),
+            "商品コード",
+            ["単価"],
+            ("開始日", "終了日"),
+        )
+        df1 = pd.DataFrame(
+            {
+                "商品コード": ["A", "A", "A", "A", "B"],
+                "日付": pd.to_datetime(
+                    ["2023-12-31", "2024-01-01", "2024-03-31", "2025-05-01", "2024-02-01"]
+                ),
+            }
+        )
+        self.assertEqual(
+            self.lookup(master, df1, "商品コード"), [None, 100, 100, 120, None]
+        )
+
+    def test_composite_key(self):
+        master = self.prepared(
+            self.periods(
+                [
+                    ("東京", "A", "2024-01-01", "2024-03-31", 100),
+                    ("東京", "A", "2024-04-01", None, 120),
+                    ("大阪", "A", "2024-01-01", "2024-03-31", 90),
+                    ("大阪", "A", "2024-07-01", None, 95),
+                ]
+            ),
+            ["拠点", "商品コード"],
+            ["単価"],
+            ("開始日", "終了日"),
+        )
+        df1 = pd.DataFrame(
+            {
+                "拠点": ["東京", "大阪", "大阪", "東京", "大阪"],
+                "商品コード": ["A"] * 5,
+                "日付": pd.to_datetime(
+                    ["2024-02-01", "2024-02-01", "2024-05-01", "2025-01-01", "2025-01-01"]
+                ),
+            }
+        )
+        self.assertEqual(
+            self.lookup(master, df1, ["拠点", "商品コード"]), [100, 90, None, 120, 95]
+        )
+
+    def test_nested_periods(self):
+        # 通年の期間の中に短い期間がある場合、短い期間外は通年の行
+        master = self.prepared(
+            self.periods(
+                [
+                    ("東京", "A", "2024-01-01", "2024-12-31", 100),
+                    ("東京", "A", "2024-03-01", "2024-03-31", 80),
+                ]
+            ),
+            "商品コード",
+            ["単価"],
+            ("開始日", "終了日"),
+        )
+        df1 = pd.DataFrame(
+            {
+                "商品コード": ["A"] * 4,
+                "日付": pd.to_datetime(
+                    ["2024-02-28", "2024-03-15", "2024-06-01", "2025-01-01"]
+                ),
+            }
+        )
+        self.assertEqual(self.lookup(master, df1, "商品コード"), [100, 80, 100, None])
+
+
+class KeyTypeJoinTest(LookupTestCase):
+    def test_engines_agree_when_key_types_differ(self):
+        master = vlookup.PreparedMaster(
+            pd.DataFrame({"コード": [1, 2, 3], "名称": ["一", "二", "三"]}),
+            "コード",
+            ["名称"],
+        )
+        df1 = pd.DataFrame({"コード": ["2", "3", "9", None]})
+        for engine in vlookup.LOOKUP_ENGINES:
+            with self.subTest(engine=engine):
+                result = self.tool.lookup_dataframe(df1, "コード", master, engine=engine)
+                self.assertEqual(values(result["名称"]), ["二", "三", None, None])
+                self.assertEqual(values(result["コード"]), ["2", "3", "9", None])
+
+    def test_colliding_string_keys_do_not_duplicate_rows(self):
+        # 1と"1"は文字列化すると同じキー（先頭行のみ使用）
+        master = vlookup.PreparedMaster(
+            pd.DataFrame({"コード": [1, "1", "A"], "名称": ["数値", "文字列", "英字"]}),
+            "コード",
+            ["名称"],
+        )
+        df1 = pd.DataFrame({"コード": ["1", "A"]})
+        for engine in vlookup.LOOKUP_ENGINES:
+            with self.subTest(engine=engine):
+                result = self.tool.lookup_dataframe(df1, "コード", master, engine=engine)
+                self.assertEqual(values(result["名称"]), ["数値", "英字"])
+
+
+class ApproximateTest(LookupTestCase):
+    def test_largest_key_not_above_search_key(self):
+        master = vlookup.PreparedMaster(
+            pd.DataFrame({"下限": [20, 0, 10], "ランク": ["C", "A", "B"]}),
+            "下限",
+            ["ランク"],
+        )
+        df1 = pd.DataFrame({"点数": [5, 10, 25, -1, None]})
+        result = self.tool.lookup_dataframe(
+            df1, "点数", master, match_mode="approximate"
+        )
+        self.assertEqual(values(result["ランク"]), ["A", "B", "C", None, None])
+
+    def test_key_types_must_match(self):
+        master = vlookup.PreparedMaster(
+            pd.DataFrame({"キー": ["a", "c"], "値": [1, 2]}), "キー", ["値"]
+        )
+        with self.assertRaises(ValueError):
+            self.tool.lookup_dataframe(
+                pd.DataFrame({"キー": [1, 2]}), "キー", master, match_mode="approximate"
+            )
+
+
+class DuplicatePolicyTest(LookupTestCase):
+    def setUp(self):
+        super().setUp()
+        self.df2 = pd.DataFrame(
+            {"コード": ["A", "B", "A", "C", "A"], "数量": [1, 2, 3, 4, 5], "名称": list("abcde")}
+        )
+
+    def resolve(self, policy):
+        data, report = self.tool.filter_master(
+            self.df2, "コード", ["数量", "名称"], duplicate_policy=policy
+        )
+        return data.set_index("コード"), report
+
+    def test_first_and_last(self):
+        data, report = self.resolve("first")
+        self.assertEqual(data.loc["A", "名称"], "a")
+        self.assertEqual(report["コード"].tolist(), ["A"])
+        data, _ = self.resolve("last")
+        self.assertEqual(data.loc["A", "名称"], "e")
+        self.assertEqual(len(data), 3)
+
+    def test_aggregate(self):
+        data, _ = self.resolve("aggregate:sum")
+        self.assertEqual(data.loc["A", "数量"], 9)
+        data, _ = self.resolve("aggregate:max")
+        self.assertEqual(data.loc["A", "数量"], 5)
+        data, _ = self.resolve("aggregate:concat")
+        self.assertEqual(data.loc["A", "名称"], "a / c / e")
+        self.assertEqual(data.loc["B", "名称"], "b")
+
+    def test_error(self):
+        with self.assertRaises(ValueError):
+            self.resolve("error")
+
+    def test_no_duplicates_reports_none(self):
+        _, report = self.tool.filter_master(
+            self.df2.drop_duplicates("コード"), "コード", ["数量"]
+        )
+        self.assertIsNone(report)
+
+    def test_parse(self):
+        self.assertEqual(vlookup.parse_duplicate_policy(None), "first")
+        self.assertEqual(vlookup.parse_duplicate_policy("aggregate"), "aggregate:concat")
+        with self.assertRaises(ValueError):
+            vlookup.parse_duplicate_policy("first:sum")
+
+
+class WorkbookTestCase(unittest.TestCase):
+    """一時ディレクトリにExcelファイルを作成するテスト"""
+
+    def setUp(self):
+        self.tool = vlookup.ExcelSheetVLOOKUP(verbosity="quiet")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.excel1 = self.path("data.xlsx")
+        self.excel2 = self.path("master.xlsx")
+        pd.DataFrame(
+            {"商品コード": ["A1", 2, "A3", "Z9", 2, "A1", "A3"], "数量": range(7)}
+        ).to_excel(self.excel1, sheet_name="注文", index=False)
+        pd.DataFrame({"商品コード": ["A1", 2, "A3"], "商品名": ["一", "二", "三"]}).to_excel(
+            self.excel2, sheet_name="マスタ", index=False
+        )
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def config(self, **kwargs):
+        config = {
+            "excel1_path": self.excel1,
+            "excel1_sheet": "注文",
+            "excel2_path": self.excel2,
+            "excel2_sheet": "マスタ",
+            "search_col": "商品コード",
+            "lookup_col": "商品コード",
+            "return_cols": ["商品名"],
+            "verbosity": "quiet",
+            "auto_save_same_dir": False,
+        }
+        config.update(kwargs)
+        return config
+
+
+class MasterCacheTest(WorkbookTestCase):
+    def master_config(self):
+        return self.config(master_cache=True, cache_dir=self.path("cache"))
+
+    def test_reuses_cache_until_master_changes(self):
+        first = self.tool.prepare_master(self.master_config())
+        self.assertTrue(os.listdir(self.path("cache")))
+
+        # 2回目はキャッシュから読み込み（Excelを読まない）
+        with mock.patch.object(self.tool, "read_excel_sheet") as read:
+            cached = self.tool.prepare_master(self.master_config())
+            read.assert_not_called()
+        pd.testing.assert_frame_equal(first.data, cached.data)
+
+        # マスタが更新されたら読み直す
+        stat = os.stat(self.excel2)
+        os.utime(self.excel2, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        with mock.patch.object(
+            self.tool, "read_excel_sheet", wraps=self.tool.read_excel_sheet
+        ) as read:
+            self.tool.prepare_master(self.master_config())
+            read.assert_called_once()
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "POSIXのみ")
+    def test_cache_file_is_private(self):
+        # umaskでグループ書き込み可になる環境でもキャッシュを使用できる
+        umask = os.umask(0o002)
+        try:
+            self.tool.prepare_master(self.master_config())
+        finally:
+            os.umask(umask)
+        cache_dir = self.path("cache")
+        cache_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        self.assertEqual(os.stat(cache_path).st_mode & 0o077, 0)
+        with mock.patch.object(self.tool, "read_excel_sheet") as read:
+            self.tool.prepare_master(self.master_config())
+            read.assert_not_called()
+
+    @unittest.skipUnless(hasattr(os, "getuid"), "POSIXのみ")
+    def test_rejects_writable_cache_file(self):
+        self.tool.prepare_master(self.master_config())
+        cache_dir = self.path("cache")
+        cache_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+
+        # 他のユーザーが書き込めるキャッシュは使用しない
+        os.chmod(cache_path, 0o620)
+        with mock.patch.object(
+            self.tool, "read_excel_sheet", wraps=self.tool.read_excel_sheet
+        ) as read:
+            self.tool.prepare_master(self.master_config())
+            read.assert_called_once()
+
+
+class ChunkedOutputTest(WorkbookTestCase):
+    def read_result(self, path, output_format):
+        if output_format == "csv":
+            return pd.read_csv(path)
+        if output_format == "parquet":
+            return pd.read_parquet(path)
+        return pd.read_excel(path, sheet_name="VLOOKUP結果")
+
+    def run_lookup(self, output_format, writer_engine, **kwargs):
+        output_path = self.path(
+            f"result_{writer_engine}_{len(kwargs)}{vlookup.OUTPUT_FORMATS[output_format]}"
+        )
+        result = self.tool.vlookup_with_sheets(
+            self.config(
+                output_path=output_path,
+                output_format=output_format,
+                writer_engine=writer_engine,
+                **kwargs,
+            )
+        )
+        self.assertTrue(result, result.error)
+        return result, self.read_result(output_path, output_format)
+
+    def check_chunked_matches_whole(self, output_format, writer_engine):
+        whole, expected = self.run_lookup(output_format, writer_engine)
+        chunked, actual = self.run_lookup(output_format, writer_engine, chunk_size=2)
+        self.assertEqual(chunked.matched_count, whole.matched_count)
+        self.assertEqual(chunked.total_count, 7)
+        self.assertEqual(values(actual["商品名"]), values(expected["商品名"]))
+        self.assertEqual(values(actual["商品名"]), ["一", "二", "三", None, "二", "一", "三"])
+
+    def test_stream_xlsx(self):
+        self.check_chunked_matches_whole("xlsx", "stream")
+
+    def test_csv(self):
+        self.check_chunked_matches_whole("csv", "stream")
+
+    def test_parquet_with_mixed_keys(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest("pyarrowが必要")
+        self.check_chunked_matches_whole("parquet", "stream")
+
+    def test_failed_chunk_removes_partial_file(self):
+        output_path = self.path("partial.csv")
+        lookup = self.tool.lookup_dataframe
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(None)
+            if len(calls) == 2:
+                raise RuntimeError("chunk failed")
+            return lookup(*args, **kwargs)
+
+        with mock.patch.object(self.tool, "lookup_dataframe", fail_second_chunk):
+            result = self.tool.vlookup_with_sheets(
+                self.config(output_path=output_path, output_format="csv", chunk_size=2)
+            )
+        self.assertFalse(result)
+        self.assertFalse(os.path.exists(output_path))
+
+
+class DuplicateSheetTest(WorkbookTestCase):
+    def setUp(self):
+        super().setUp()
+        pd.DataFrame(
+            {"商品コード": ["A1", 2, "A1"], "商品名": ["一", "二", "いち"]}
+        ).to_excel(self.excel2, sheet_name="マスタ", index=False)
+
+    def test_explicit_output_path_has_duplicate_sheet(self):
+        for chunk_size in (None, 2):
+            with self.subTest(chunk_size=chunk_size):
+                output_path = self.path(f"result_{chunk_size}.xlsx")
+                result = self.tool.vlookup_with_sheets(
+                    self.config(output_path=output_path, chunk_size=chunk_size)
+                )
+                self.assertTrue(result, result.error)
+                report = pd.read_excel(output_path, sheet_name="重複キー")
+                self.assertEqual(report["商品コード"].tolist(), ["A1"])
+
+
+class ReadExcelSheetTest(WorkbookTestCase):
+    def test_usecols(self):
+        df = self.tool.read_excel_sheet(self.excel1, "注文", usecols=["数量"])
+        self.assertEqual(list(df.columns), ["数量"])
+        self.assertEqual(len(df), 7)
+
+    def test_missing_column(self):
+        self.assertIsNone(
+            self.tool.read_excel_sheet(self.excel1, "注文", usecols=["数量", "なし"])
+        )
+        df = self.tool.read_excel_sheet(
+            self.excel1, "注文", usecols=["数量", "なし"], missing_ok=True
+        )
+        self.assertEqual(list(df.columns), ["数量"])
+
+    def test_streaming_keeps_blank_rows(self):
+        from openpyxl import Workbook
+
+        path = self.path("blank.xlsx")
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "注文"
+        for row in (["商品コード", "数量"], ["A1", 1], [None, None], [2, 3], ["A3", 4]):
+            ws.append(row)
+        # 書式だけ設定された末尾の空行は読み込まない
+        ws.cell(row=8, column=1).number_format = "0"
+        wb.save(path)
+
+        expected = pd.read_excel(path, sheet_name="注文")
+        chunks = list(self.tool.iter_excel_sheet(path, "注文", chunk_size=2))
+        actual = pd.concat(chunks, ignore_index=True)
+        self.assertEqual(len(actual), len(expected))
+        self.assertEqual(values(actual["商品コード"]), values(expected["商品コード"]))
+
+    def test_closes_handle(self):
+        self.tool.read_excel_sheet(self.excel1, "注文")
+        self.assertEqual(self.tool._workbooks, {})
+
+
+if __name__ == "__main__":
+    unittest.main()